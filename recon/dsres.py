@@ -0,0 +1,194 @@
+import math
+import struct
+
+# Numpy types for the precision (the "P" digit of the type) and byte
+# order (the "M" digit) of MATLAB v4 matrices
+PRECISIONS = {0: 'f8', 1: 'f4', 2: 'i4', 3: 'i2', 4: 'u2', 5: 'u1'}
+BYTE_ORDERS = {0: '<', 1: '>'}
+
+class DsresReader(object):
+    """
+    This class reads result files in 'dsres' format (i.e., the MATLAB
+    v4 files written by Dymola and OpenModelica).  The file is memory
+    mapped and only the matrices describing the variables are read when
+    it is opened.  The data for a variable is a view of the mapped file,
+    so it is only read when it is used.  The methods (and the _vars
+    attribute) follow those of DyMat's DyMatFile.
+    """
+    def __init__(self, file):
+        """
+        Open a dsres file.  The file can be given either as a file name
+        or as a file object.
+        """
+        import numpy
+
+        self.mm = numpy.memmap(file, dtype='u1', mode='r')
+        self.matrices = {} # name -> (dtype, rows, columns, offset)
+        self._scan()
+
+        self._vars = {} # name -> (description, block, column, sign)
+        self._blocks = []
+        self._data = {} # block -> (variables x points) array
+
+        if not "Aclass" in self.matrices:
+            raise IOError("Invalid format: File is not a dsres file")
+        info = self._strings("Aclass")
+        if len(info)>3 and info[1]=="1.1" and info[3] in ["binTrans", "binNormal"]:
+            # In the (more common) transposed form, each column of the
+            # name, description and data matrices is a variable
+            trans = info[3]=="binTrans"
+            names = self._strings("name", trans=trans)
+            descr = self._strings("description", trans=trans)
+            dinfo = self._matrix("dataInfo")
+            if not trans:
+                dinfo = dinfo.T
+            for i in range(len(names)):
+                d = int(dinfo[0][i]) # data block
+                x = int(dinfo[1][i])
+                c = abs(x)-1 # column
+                s = math.copysign(1.0, x) # sign
+                if c:
+                    self._vars[names[i]] = (descr[i], d, c, s)
+                    if not d in self._blocks:
+                        self._blocks.append(d)
+                        data = self._matrix("data_%d" % (d,))
+                        self._data[d] = data if trans else data.T
+                else:
+                    self._absc = (names[i], descr[i])
+        elif len(info)>1 and info[1]=="1.0":
+            # Only the plotted variables, all in a single block
+            names = self._strings("names")
+            self._blocks.append(0)
+            self._data[0] = self._matrix("data").T
+            self._absc = (names[0], '')
+            for i in range(1, len(names)):
+                self._vars[names[i]] = ('', 0, i, 1)
+        else:
+            raise IOError("Unsupported dsres file structure: "+str(info))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def _scan(self):
+        """
+        Record the type, size and location of each matrix in the file
+        """
+        import numpy
+
+        off = 0
+        while off+20<=len(self.mm):
+            head = self.mm[off:off+20].tostring()
+            (mtype, rows, cols, imagf, namlen) = struct.unpack('<5i', head)
+            if mtype<0 or mtype>9999:
+                # Big-endian headers look like this when read as
+                # little-endian
+                (mtype, rows, cols, imagf, namlen) = struct.unpack('>5i', head)
+            order = mtype/1000
+            prec = (mtype/10)%10
+            if not order in BYTE_ORDERS or not prec in PRECISIONS:
+                raise IOError("Unsupported matrix type %d at %d" % (mtype, off))
+            off += 20
+            name = self.mm[off:off+namlen].tostring().rstrip('\x00')
+            off += namlen
+            dtype = numpy.dtype(BYTE_ORDERS[order]+PRECISIONS[prec])
+            self.matrices[name] = (dtype, rows, cols, off)
+            # Any imaginary part follows the real part
+            off += rows*cols*dtype.itemsize*(2 if imagf else 1)
+        if off!=len(self.mm):
+            raise IOError("Invalid format: File is truncated")
+
+    def _matrix(self, name):
+        """
+        A (rows x columns) view of the named matrix
+        """
+        import numpy
+
+        if not name in self.matrices:
+            raise IOError("Invalid format: No matrix named "+name)
+        (dtype, rows, cols, off) = self.matrices[name]
+        # Matrices are stored column by column
+        return numpy.ndarray((cols, rows), dtype=dtype, buffer=self.mm,
+                             offset=off).T
+
+    def _strings(self, name, trans=False):
+        """
+        The rows (or, if trans is True, the columns) of the named
+        (character) matrix as strings
+        """
+        import numpy
+
+        chars = self._matrix(name)
+        if trans:
+            chars = chars.T
+        chars = numpy.ascontiguousarray(chars, dtype='u1')
+        # Strings are padded with blanks or NULs
+        return map(lambda x: x.tostring().replace('\x00', '').decode("latin-1").rstrip(),
+                   chars)
+
+    def blocks(self):
+        """
+        The numbers of all data blocks
+        """
+        return self._blocks
+
+    def names(self, block=None):
+        """
+        The names of all variables (or only those in the given block)
+        """
+        if block==None:
+            return self._vars.keys()
+        return [k for (k, v) in self._vars.items() if v[1]==block]
+
+    def data(self, name):
+        """
+        The values of the named variable (as a numpy array)
+        """
+        (desc, d, c, s) = self._vars[name]
+        ret = self._data[d][c]
+        if s<0:
+            ret = -ret
+        return ret
+
+    def block(self, name):
+        """
+        The block number of the named variable
+        """
+        return self._vars[name][1]
+
+    def description(self, name):
+        """
+        The description of the named variable
+        """
+        return self._vars[name][0]
+
+    def size(self, block_or_name):
+        """
+        The number of points in a block (or in the block of the named
+        variable)
+        """
+        return self._data[self._block(block_or_name)].shape[1]
+
+    def abscissa(self, block_or_name, valuesOnly=False):
+        """
+        The values, name and description of the abscissa of a block
+        (or of the block of the named variable).  If valuesOnly is
+        True, only the values are returned.
+        """
+        values = self._data[self._block(block_or_name)][0]
+        if valuesOnly:
+            return values
+        return (values, self._absc[0], self._absc[1])
+
+    def _block(self, block_or_name):
+        if block_or_name in self._vars:
+            return self._vars[block_or_name][1]
+        return int(block_or_name)
+
+    def close(self):
+        # Arrays already returned keep the mapping open until they
+        # are discarded
+        self.mm = None
+        self._data = {}
@@ -1,8 +1,13 @@
 import sys
+import struct
+from collections import deque
 
 from serial import BSONSerializer, MsgPackSerializer, UMsgPackSerializer
+from serial import codec_name, check_filters
 
-from util import write_len, read_len, conv_len, parse_transform
+from util import write_len, read_len, conv_len, parse_transform, LRUCache
+from util import vector_size
+from util import summarize, pyramid, summary_levels, join_vectors, rechunk
 
 #DEFSER = BSONSerializer
 DEFSER = MsgPackSerializer
@@ -12,11 +17,21 @@ DEFSER = MsgPackSerializer
 # it can be identified/verified.
 MELD_ID = "recon:meld:v01"
 
+# Melds that use features earlier readers don't know about (typed
+# vectors, filters, chunks, codecs other than bz2 or a split or
+# relocated header) start with this ID instead, so that those
+# readers refuse them rather than misinterpret them
+MELD_ID_V2 = "recon:meld:v02"
+MELD_IDS = [MELD_ID, MELD_ID_V2]
+
 # Meld
 H_METADATA = "fmeta"
 H_TABLES = "tabs"
 H_OBJECTS = "objs"
 H_COMP = "comp"
+H_TYPED = "typd"
+H_RELOC = "relo"
+H_SPLIT = "splt"
 
 # Tables
 T_INDICES = "toff"
@@ -29,6 +44,18 @@ V_INDEX = "i"
 V_INDHOLD = b'\x00\x00\x00\x00'
 V_LENGTH = "l"
 V_TRANS = "t"
+V_COMP = "c"
+V_FILTER = "f"
+V_CHUNK = "k"
+V_SUMMARY = "m"
+
+# Chunk index (for chunked variables)
+C_COUNT = "n"
+C_CHUNKS = "c"
+
+# Summaries (for variables with summaries)
+S_COUNT = "n"
+S_LEVELS = "l"
 
 # Alias
 A_OF = "s"
@@ -36,6 +63,25 @@ A_OF = "s"
 # Object
 O_METADATA = "ometa"
 
+# Vectors no further apart than this (in bytes) are fetched with a
+# single read by MeldTableReader.read_many
+COALESCE_GAP = 64*1024
+
+# ...as long as that read is no longer than this (in bytes)
+COALESCE_MAX = 4*1024*1024
+
+# Default number of bytes of decoded vectors kept in a MeldReader's cache
+DEFAULT_CACHE_SIZE = 16*1024*1024
+
+# Default number of values summarized by each block of the finest
+# summaries and the number of blocks combined at each coarser level
+SUMMARY_BLOCK = 256
+SUMMARY_FACTOR = 4
+
+# Kinds of numpy arrays that can be written for signals of each type
+VTYPE_KINDS = {float: "f", int: "iu", long: "iu", bool: "b", str: "S",
+               unicode: "U"}
+
 class MeldNotFinalized(Exception):
     """
     Thrown when data is written to a meld that hasn't been finalized.
@@ -77,9 +123,38 @@ class WriteAfterClose(Exception):
 
 class MeldWriter(object):
     def __init__(self, file, metadata={}, compression=False,
-                 verbose=False, single=False):
+                 verbose=False, single=False, typed=False, workers=None,
+                 level=None, chunk_size=None, summaries=False,
+                 split_header=False):
         """
-        This is the constructor for the meld writer.
+        This is the constructor for the meld writer.  The compression
+        argument can be False (no compression), True (bz2 compression)
+        or the name of a compression codec (e.g., "zlib" or "zstd").
+        The level argument sets the compression level.  If typed is True,
+        homogeneous vectors of floats, integers or booleans are stored
+        as typed vectors (contiguous little-endian values) rather than
+        as msgpack arrays.
+
+        If workers is given (and positive), vectors are encoded (and
+        compressed) by a pool of that many threads.  They are still
+        written to the file in the order they were given to the table
+        writers.  Note that in this case data passed to a table writer
+        must not be modified until the meld is closed.
+
+        If chunk_size is given, signals are stored as a series of
+        chunks holding (at most) that many values each so that ranges
+        of values can be read without decoding the whole signal.  This
+        can be overridden for individual signals.
+
+        If summaries is True (or a block size), the minimum, maximum and
+        mean of blocks of values of each numeric signal are stored at
+        several resolutions so that readers can draw an envelope of the
+        signal without reading its data (see data_decimated).
+
+        If split_header is True, the header only holds a directory of
+        the tables and the information about each table is stored in a
+        separate section so that readers only need to decode the
+        sections of the tables they actually read.
 
         Note: All metadata must be supplied at the time when the meld
         is created.
@@ -95,12 +170,34 @@ class MeldWriter(object):
         self.fp = fp
         self.verbose = verbose
         self.compression = compression
+        self.codec = codec_name(compression)
+        self.typed = typed
+        self.chunk_size = chunk_size
+        self.summaries = summaries
+        if summaries==True:
+            self.summaries = SUMMARY_BLOCK
+        self.split = split_header
+        self.sections = {} # table name -> table data (if split)
+        self._seclens = {} # table name -> space for its section
         self.tables = {} # table name -> MeldTableWriter
         self.objects = {} # object name -> MeldObjectWriter
         self._metadata = metadata
-        self.ser = DEFSER(compress=self.compression, single=True)
+        self.ser = DEFSER(compress=self.compression, single=True,
+                          typed=self.typed, level=level)
+        # Used for anything that must keep full precision (summaries)
+        self.fullser = DEFSER(compress=self.compression, typed=self.typed,
+                              level=level)
+
+        # Vectors waiting to be written (in order), i.e., (result, callback)
+        self.pending = deque()
+        self.pool = None
+        if workers!=None and workers>0:
+            from multiprocessing.pool import ThreadPool
+            self.workers = workers
+            self.pool = ThreadPool(workers)
 
         # Everything after here is set when finalized
+        self.meld_id = MELD_ID
         self.defined = False
         self.header = None
         self.start = None
@@ -155,10 +252,18 @@ class MeldWriter(object):
         Extracts header information about a given signal
         in a given table.
         """
-        t = self.header[H_TABLES][table][T_INDICES]
+        t = self._table_data(table)[T_INDICES]
         s = t[signal]
         return s
 
+    def _table_data(self, table):
+        """
+        Header information about a given table
+        """
+        if self.split:
+            return self.sections[table]
+        return self.header[H_TABLES][table]
+
     def _object_header(self, objname):
         """
         Extracts header information about a given object
@@ -187,34 +292,74 @@ class MeldWriter(object):
             # If we have not written the header previously...
             if self.verbose:
                 print "Writing header for the first time"
-            self.fp.write(MELD_ID)
+            self.fp.write(self.meld_id)
             write_len(self.fp, blen)
             self.fp.write(bhead)
-            self.start = self.fp.tell()
             self.headlen = blen
+            if self.split:
+                self._write_sections()
+            self.start = self.fp.tell()
         else:
             # If this is a rewrite of the header...
             if self.verbose:
                 print "Rewriting header"
-            if blen>self.headlen: # pragma: no cover
-                raise IOError("Header length increased on rewrite")
             # Save where we are
             save = self.fp.tell()
+            if self.split:
+                self._write_sections()
+                bhead = self.ser.encode_obj(self.header, uncomp=True)
+                blen = len(bhead)
+            if blen>self.headlen: # pragma: no cover
+                raise IOError("Header length increased on rewrite")
             # Jump back to the start of the file
             self.fp.seek(0)
             # Rewrite the header
-            self.fp.write(MELD_ID)
+            self.fp.write(self.meld_id)
             write_len(self.fp, blen)
             self.fp.write(bhead)
             # Jump back to where we were when this function was called
             self.fp.seek(save)
 
-    def _write_object(self, obj):
+    def _write_sections(self):
+        """
+        Write the table sections of a split header.  The first time,
+        they are written at the current position.  After that, they
+        are rewritten in place (and, like the header, cannot grow).
+        """
+        for tname in sorted(self.sections):
+            bsec = self.ser.encode_obj(self.sections[tname], uncomp=True)
+            entry = self.header[H_TABLES][tname]
+            if entry[V_INDEX]==V_INDHOLD:
+                entry[V_INDEX] = long(self.fp.tell())
+                self._seclens[tname] = len(bsec)
+                self.fp.write(bsec)
+            else:
+                if len(bsec)>self._seclens[tname]: # pragma: no cover
+                    raise IOError("Section length of table "+tname+\
+                                  " increased on rewrite")
+                self.fp.seek(entry[V_INDEX])
+                self.fp.write(bsec)
+            entry[V_LENGTH] = long(len(bsec))
+        if self.start==None:
+            # The directory now refers to the sections
+            save = self.fp.tell()
+            bhead = self.ser.encode_obj(self.header, uncomp=True)
+            if len(bhead)>self.headlen: # pragma: no cover
+                raise IOError("Header length increased on rewrite")
+            self.fp.seek(0)
+            self.fp.write(self.meld_id)
+            write_len(self.fp, len(bhead))
+            self.fp.write(bhead)
+            self.fp.seek(save)
+
+    def _write_object(self, obj, single=True):
         """
-        Code to write an object to the stream
+        Code to write an object to the stream (single=False means
+        floats are written with full precision)
         """
         base = self.fp.tell()
-        bdata = self.ser.encode_obj(obj)
+        ser = self.ser if single else self.fullser
+        bdata = ser.encode_obj(obj)
         blen = len(bdata)
         if self.verbose:
             print "Binary data: "+str(repr(bdata))
@@ -222,12 +367,20 @@ class MeldWriter(object):
         self.fp.write(bdata)
         return (base, blen)
 
-    def _write_vector(self, vec):
+    def _write_vector(self, vec, codec=None, filters=None):
+        """
+        Code to write a vector of data to the stream (codec overrides
+        the compression codec for this vector and filters are applied
+        before compression)
+        """
+        return self._write_encoded(self.ser.encode_vec(vec, codec=codec,
+                                                       filters=filters))
+
+    def _write_encoded(self, bdata):
         """
-        Code to write a vector of data to the stream
+        Code to write an (already encoded) vector to the stream
         """
         base = self.fp.tell()
-        bdata = self.ser.encode_vec(vec)
         blen = len(bdata)
         if self.verbose:
             print "Binary data: "+str(repr(bdata))
@@ -235,6 +388,35 @@ class MeldWriter(object):
         self.fp.write(bdata)
         return (base, blen)
 
+    def _submit_vector(self, vec, done, codec=None, filters=None):
+        """
+        Arrange for a vector to be written to the stream.  Once it has
+        been written, done is called with its index and length.  If
+        there is a pool of workers, the vector is encoded by the pool.
+        """
+        if self.pool==None:
+            done(*self._write_vector(vec, codec=codec, filters=filters))
+            return
+        opts = {"codec": codec, "filters": filters}
+        self.pending.append((self.pool.apply_async(self.ser.encode_vec,
+                                                   (vec,), opts),
+                             done))
+        # Limit the number of vectors held in memory
+        self._drain(limit=2*self.workers)
+
+    def _drain(self, limit=0):
+        """
+        Write out (in order) pending vectors that have been encoded.
+        Waits for encoding to complete while there are more than limit
+        pending vectors.
+        """
+        while len(self.pending)>0:
+            (result, done) = self.pending[0]
+            if len(self.pending)<=limit and not result.ready():
+                break
+            self.pending.popleft()
+            done(*self._write_encoded(result.get()))
+
     def finalize(self):
         """
         Finalize the meld (i.e. the header structure).  We may change
@@ -246,38 +428,134 @@ class MeldWriter(object):
                        H_METADATA: self._metadata}
         for tname in self.tables:
             table = self.tables[tname]
-            index = {} # var name -> header info
-            for sig in table.signals:
-                index[sig] = {V_INDEX: V_INDHOLD,
-                              V_LENGTH: V_INDHOLD}
-            for alias in table.aliases:
-                index[alias] = {V_INDEX: V_INDHOLD,
-                                V_LENGTH: V_INDHOLD}
-                if V_TRANS in table.aliases[alias]:
-                    index[alias][V_TRANS] = table.aliases[alias][V_TRANS]
-            self.header[H_TABLES][tname] = {T_VARIABLES: table.variables,
-                                            T_INDICES: index,
-                                            T_METADATA: table._metadata,
-                                            T_VMETADATA: table._vmd}
+            tdata = {T_VARIABLES: table.variables,
+                     T_INDICES: self._table_index(table),
+                     T_METADATA: table._metadata,
+                     T_VMETADATA: table._vmd}
+            if self.split:
+                self.sections[tname] = tdata
+                self.header[H_TABLES][tname] = {V_INDEX: V_INDHOLD,
+                                                V_LENGTH: V_INDHOLD}
+            else:
+                self.header[H_TABLES][tname] = tdata
         for oname in self.objects:
             self.header[H_OBJECTS][oname] = {V_INDEX: V_INDHOLD,
                                              V_LENGTH: V_INDHOLD,
                                              O_METADATA: self.objects[oname]}
 
-        self.header[H_COMP] = self.compression
+        # For compatibility with earlier readers, bz2 is indicated by true
+        if self.codec=="bz2":
+            self.header[H_COMP] = True
+        elif self.codec==None:
+            self.header[H_COMP] = False
+        else:
+            self.header[H_COMP] = self.codec
+        self.header[H_TYPED] = self.typed
+        if self.split:
+            self.header[H_SPLIT] = True
 
+        self.meld_id = self._meld_id()
         self._write_header()
         self.defined = True
 
+    def _meld_id(self):
+        """
+        The ID to start this meld with (see MELD_ID_V2)
+        """
+        if self.typed or self.split or not self.codec in [None, "bz2"]:
+            return MELD_ID_V2
+        for table in self.tables.values():
+            if table._codecs or table._filters:
+                return MELD_ID_V2
+            for sig in table.signals:
+                if table._chunk_size(sig):
+                    return MELD_ID_V2
+        return MELD_ID
+
+    def _table_index(self, table):
+        """
+        Header information for the variables of a table (with
+        placeholders for anything that is only known once the data
+        has been written)
+        """
+        index = {} # var name -> header info
+        for sig in table.signals:
+            index[sig] = {V_INDEX: V_INDHOLD,
+                          V_LENGTH: V_INDHOLD}
+            if sig in table._codecs:
+                index[sig][V_COMP] = table._codecs[sig]
+            if sig in table._filters:
+                index[sig][V_FILTER] = table._filters[sig]
+            if table._chunk_size(sig):
+                index[sig][V_CHUNK] = table._chunk_size(sig)
+            if self.summaries:
+                index[sig][V_SUMMARY] = [V_INDHOLD, V_INDHOLD]
+        for alias in table.aliases:
+            of = table.aliases[alias][A_OF]
+            if of in table._existing:
+                # Aliases of signals that were already written share
+                # the header information of that signal
+                index[alias] = dict(table._existing[of])
+                index[alias].pop(V_TRANS, None)
+                if V_TRANS in table.aliases[alias]:
+                    index[alias][V_TRANS] = table.aliases[alias][V_TRANS]
+                continue
+            index[alias] = {V_INDEX: V_INDHOLD,
+                            V_LENGTH: V_INDHOLD}
+            if V_TRANS in table.aliases[alias]:
+                index[alias][V_TRANS] = table.aliases[alias][V_TRANS]
+            # Aliases share the data (and therefore codec and
+            # filters) of their signal
+            if of in table._codecs:
+                index[alias][V_COMP] = table._codecs[of]
+            if of in table._filters:
+                index[alias][V_FILTER] = table._filters[of]
+            if table._chunk_size(of):
+                index[alias][V_CHUNK] = table._chunk_size(of)
+            if self.summaries:
+                index[alias][V_SUMMARY] = [V_INDHOLD, V_INDHOLD]
+        return index
+
     def close(self):
         """
         Close this meld for any more writing.
         """
         if self.closed:
             return # This can happen if explicitly close in combination with "with"
+        try:
+            self._drain()
+        finally:
+            self._stop_pool()
         self._write_header()
         if not self.defined:
             self.finalize()
+        missing = self._missing()
+        if len(missing)>0:
+            raise MissingData("Data not written for: "+str(missing))
+        self.closed = True
+        if self.shouldClose:
+            self.fp.close()
+
+    def _stop_pool(self):
+        """
+        Shut down the pool of workers (if any).  Any vectors that are
+        still pending (e.g., because an encoding failed) are abandoned.
+        """
+        if self.pool==None:
+            return
+        if len(self.pending)>0:
+            self.pending.clear()
+            self.pool.terminate()
+        else:
+            self.pool.close()
+        self.pool.join()
+        self.pool = None
+
+    def _missing(self):
+        """
+        The names of the signals and objects whose data hasn't been
+        written (yet)
+        """
         missing = []
         for table in self.tables:
             for signal in self.tables[table].signals:
@@ -285,21 +563,18 @@ class MeldWriter(object):
                     missing.append(signal)
         for obj in self.objects:
             if self._object_header(obj)[V_INDEX]==V_INDHOLD:
-                missing.append(name)
-        if len(missing)>0:
-            raise MissingData("Data not written for: "+str(missing))
-        self.closed = True
-        if self.shouldClose:
-            self.fp.close()
+                missing.append(obj)
+        return missing
 
 class MeldTableWriter(object):
     """
     This class is used to write tables to a meld
     """
-    def __init__(self, writer, name, metadata={}):
+    def __init__(self, writer, name, metadata={}, existing={}):
         """
         Initialized by MeldWriter with information about
-        this particular table.
+        this particular table (existing holds the header information
+        of any variables the table already contains).
         """
         self.writer = writer
         self.name = name
@@ -310,6 +585,11 @@ class MeldTableWriter(object):
         self._metadata = metadata
         self._vmd = {} # signal -> metadata
         self._vtypes = {} # signal -> type
+        self._codecs = {} # signal -> compression codec (or False)
+        self._filters = {} # signal -> list of filters
+        self._chunks = {} # signal -> chunk size (0 means not chunked)
+        self._written = set() # signals whose data has been submitted
+        self._existing = existing # variable -> header info (when appending)
 
     def _check_name(self, name):
         """
@@ -319,10 +599,20 @@ class MeldTableWriter(object):
             raise NameError("Table already contains a signal named "+name)
         if name in self.aliases:
             raise NameError("Table already contains an alias named "+name)
+        if name in self._existing:
+            raise NameError("Table already contains a variable named "+name)
 
-    def add_signal(self, name, metadata=None, vtype=None):
+    def add_signal(self, name, metadata=None, vtype=None, compression=None,
+                   filters=None, chunk_size=None):
         """
-        Used to add a signal to a table.
+        Used to add a signal to a table.  If compression is given, it
+        overrides the meld's compression for this signal (False means
+        no compression, otherwise it is a codec name).  Filters (e.g.,
+        ["delta", "shuffle"]) are applied, in order, to the values of
+        this signal before compression.  They require typed vectors and
+        only apply if the data is actually stored as a typed vector.
+        If chunk_size is given, it overrides the meld's chunk size for
+        this signal (0 means the signal is not chunked).
 
         Note: All metadata must be supplied at the time the signal
         is added.
@@ -339,6 +629,23 @@ class MeldTableWriter(object):
             if type(vtype)!=type:
                 raise TypeError("Type specifier '"+str(vtype)+"' is not a type")
             self._vtypes[name] = vtype
+        if compression!=None:
+            self._codecs[name] = codec_name(compression) or False
+        if filters:
+            if not self.writer.typed:
+                raise ValueError("Filters can only be used with typed vectors")
+            check_filters(filters)
+            self._filters[name] = list(filters)
+        if chunk_size!=None:
+            if chunk_size<0:
+                raise ValueError("Chunk size for "+name+" cannot be negative")
+            self._chunks[name] = chunk_size
+
+    def _chunk_size(self, sig):
+        """
+        Chunk size of a given signal (0 or None if it isn't chunked)
+        """
+        return self._chunks.get(sig, self.writer.chunk_size)
 
     def add_alias(self, alias, of, transform=None, metadata=None):
         """
@@ -348,7 +655,10 @@ class MeldTableWriter(object):
         is added.
         """
         self._check_name(alias)
-        if not of in self.signals:
+        if of in self._existing:
+            if V_TRANS in self._existing[of]:
+                raise NameError("Alias "+alias+" refers to alias "+of)
+        elif not of in self.signals:
             raise NameError("Alias "+alias+" refers to non-existant signal "+of)
         self.variables.append(alias)
 
@@ -374,27 +684,171 @@ class MeldTableWriter(object):
 
     def write(self, sig, data):
         """
-        Used to write data (i.e. a column) to this table.
+        Used to write data (i.e. a column) to this table.  The data can
+        be a list or a (one dimensional) numpy array.
+        """
+        self._check_write(sig)
+        data = self._check_data(sig, data)
+
+        # Write the data to disk and record its index and length
+        self._written.add(sig)
+        if self.writer.summaries:
+            self._write_summaries(sig, len(data),
+                                  pyramid(data, self.writer.summaries,
+                                          SUMMARY_FACTOR))
+        codec = self._codecs.get(sig, None)
+        filters = self._filters.get(sig, None)
+        if self._chunk_size(sig):
+            self._write_chunks(sig, [data], self._chunk_size(sig), codec,
+                               filters)
+            return
+        self.writer._submit_vector(data,
+                                   lambda base, blen: self._fill(sig, base, blen),
+                                   codec=codec, filters=filters)
+
+    def stream(self, sig, pieces):
+        """
+        Used to write data for a signal given as a series of pieces
+        (lists or numpy arrays), e.g., read one at a time from another
+        file.  If the signal is chunked, each chunk is written as soon
+        as its values are available so the data is never held in
+        memory all at once.  Otherwise, this is the same as writing the
+        pieces joined together.
+        """
+        size = self._chunk_size(sig)
+        if not size:
+            self.write(sig, join_vectors(list(pieces)))
+            return
+        self._check_write(sig)
+        self._written.add(sig)
+
+        block = self.writer.summaries
+        count = [0]
+        summary = [([], [], [])]
+
+        def checked():
+            for piece in pieces:
+                piece = self._check_data(sig, piece)
+                count[0] += len(piece)
+                yield piece
+
+        def summarized():
+            # Summaries are computed one block at a time
+            for values in rechunk(checked(), block):
+                if summary[0]!=None:
+                    part = summarize(values, block)
+                    if part==None:
+                        summary[0] = None
+                    else:
+                        for (col, vals) in zip(summary[0], part):
+                            col.extend(vals)
+                yield values
+
+        self._write_chunks(sig, summarized() if block else checked(), size,
+                           self._codecs.get(sig, None),
+                           self._filters.get(sig, None))
+        if block:
+            levels = None
+            if summary[0]!=None:
+                levels = summary_levels(summary[0], block, count[0],
+                                        SUMMARY_FACTOR)
+            self._write_summaries(sig, count[0], levels)
+
+    def _check_write(self, sig):
+        """
+        Checks that data can (still) be written for a signal
         """
         if not self.writer.defined:
             raise MeldNotFinalized("Meld must be finalized before writing data")
         if not sig in self.signals:
             raise NameError("Cannot write unknown signal "+sig+" to table")
-        if self.writer._signal_header(self.name, sig)[V_INDEX]!=V_INDHOLD:
+        if sig in self._written:
             raise WriteAfterClose("Signal "+sig+" has already been written")
-        if not type(data)==list:
-            raise ValueError("Data for signal "+sig+" must be a list")
+
+    def _check_data(self, sig, data):
+        """
+        Checks the data (or a piece of the data) for a signal and
+        returns it in the form it will be written in
+        """
+        if hasattr(data, "dtype"): # numpy array
+            if data.ndim!=1:
+                raise ValueError("Data for signal "+sig+" must be one dimensional")
+            if data.dtype.kind=='O':
+                data = data.tolist()
+        elif not type(data)==list:
+            raise ValueError("Data for signal "+sig+" must be a list or numpy array")
 
         # TODO: Make sure it is the correct size (matches any previous)
         if sig in self._vtypes:
-            for val in data:
-                if type(val)!=self._vtypes[sig]:
-                    raise TypeError("Value in '%s' (%s:%s) doesn't match expected type %s" % \
-                                    (sig, str(val), str(type(val)), str(self._vtypes[sig])))
-
-        # Write the data to disk and return the index and length
-        (base, blen) = self.writer._write_vector(data)
-
+            vtype = self._vtypes[sig]
+            if type(data)==list:
+                for val in data:
+                    if type(val)!=vtype:
+                        raise TypeError("Value in '%s' (%s:%s) doesn't match expected type %s" % \
+                                        (sig, str(val), str(type(val)), str(vtype)))
+            elif not data.dtype.kind in VTYPE_KINDS.get(vtype, ""):
+                # Arrays are checked by the kind of their elements
+                raise TypeError("Values in '%s' (%s) don't match expected type %s" % \
+                                (sig, str(data.dtype), str(vtype)))
+        return data
+
+    def _write_summaries(self, sig, count, levels):
+        """
+        Write the summaries (levels) of the count values of a signal
+        and record where they are for the signal and its aliases.
+        Signals that aren't numeric have no summaries (levels is None).
+        """
+        loc = None
+        if levels!=None:
+            (base, blen) = self.writer._write_object({S_COUNT: count,
+                                                      S_LEVELS: levels},
+                                                     single=False)
+            loc = [long(base), long(blen)]
+        for name in [sig]+self.alias_map.get(sig, []):
+            head = self.writer._signal_header(self.name, name)
+            if loc==None:
+                del head[V_SUMMARY]
+            else:
+                head[V_SUMMARY] = loc
+
+    def _write_chunks(self, sig, pieces, size, codec, filters):
+        """
+        Write the values in pieces (a series of vectors) as a series of
+        chunks (each holding size values).  Once the last chunk has been
+        written, an index of the chunks is written and its index and
+        length are recorded in the header.
+        """
+        chunks = []
+        count = [0]
+        # Chunks not written yet (plus one until all have been submitted)
+        remaining = [1]
+
+        def finish():
+            index = {C_COUNT: count[0], C_CHUNKS: chunks}
+            bdata = self.writer.ser.encode_obj(index, uncomp=True)
+            self._fill(sig, *self.writer._write_encoded(bdata))
+
+        def done(k, base, blen):
+            chunks[k] = [long(base), long(blen)]
+            remaining[0] -= 1
+            if remaining[0]==0:
+                finish()
+
+        for (k, chunk) in enumerate(rechunk(pieces, size)):
+            chunks.append(None)
+            count[0] += len(chunk)
+            remaining[0] += 1
+            self.writer._submit_vector(chunk,
+                                       lambda base, blen, k=k: done(k, base, blen),
+                                       codec=codec, filters=filters)
+        remaining[0] -= 1
+        if remaining[0]==0:
+            finish()
+
+    def _fill(self, sig, base, blen):
+        """
+        Fill in the index and length of a signal once it is written
+        """
         # Get the header for this signal and fill in the index and length
         sighead = self.writer._signal_header(self.name, sig)
         sighead[V_INDEX] = long(base)
@@ -432,14 +886,180 @@ class MeldObjectWriter(object):
         self.writer._object_header(self.name)[V_INDEX] = long(base)
         self.writer._object_header(self.name)[V_LENGTH] = long(blen)
 
+class MeldAppender(MeldWriter):
+    """
+    This class is used to add tables, objects and variables to an
+    existing meld without rewriting it.  New data is appended to the
+    end of the file, followed by the new header.  The header at the
+    start of the file is then replaced by a pointer to the new header.
+    """
+    def __init__(self, file, verbose=False, workers=None, level=None,
+                 chunk_size=None, summaries=False):
+        """
+        Opens an existing meld for appending.  New data is written
+        using the compression and typed vector settings of the meld.
+        The remaining arguments are as for MeldWriter.
+        """
+        # If a file name is passed, open the file...in *binary* mode
+        if type(file)==str or type(file)==unicode:
+            fp = open(file, "r+b")
+            shouldClose = True
+        else:
+            fp = file # Assume this is a file
+            shouldClose = False
+
+        # Length of the header at the front of the file (which limits
+        # the size of the pointer written there)
+        fp.seek(0)
+        lead = fp.read(len(MELD_ID)+4)
+        fp.seek(0)
+        reader = MeldReader(fp, cache_size=0)
+
+        MeldWriter.__init__(self, fp, metadata=reader.metadata,
+                            compression=reader.compression, verbose=verbose,
+                            typed=reader.typed, workers=workers, level=level,
+                            chunk_size=chunk_size, summaries=summaries)
+        self.shouldClose = shouldClose
+        self.header = reader.header
+        # If the header is split, only the sections of tables that
+        # change are read (and written again with the new header)
+        self.split = reader.split
+        self._reader = reader
+        # Earlier readers don't know about relocated headers
+        self.meld_id = MELD_ID_V2
+        self.headlen = conv_len(lead[-4:])
+        self.fp.seek(0, 2)
+
+    def _check_names(self, name):
+        """
+        New names must also be unique with respect to the tables and
+        objects already in the meld.
+        """
+        MeldWriter._check_names(self, name)
+        if name in self.header[H_TABLES]:
+            raise NameError("Meld already contains a table named "+name)
+        if name in self.header[H_OBJECTS]:
+            raise NameError("Meld already contains an object named "+name)
+
+    def extend_table(self, name):
+        """
+        Used to add signals and aliases to a table that is already in
+        the meld.
+        """
+        if self.defined:
+            raise FinalizedMeld()
+        if name in self.tables:
+            return self.tables[name]
+        if not name in self.header[H_TABLES]:
+            raise NameError("No table named "+name+" found")
+        theader = self._reader._table_header(name)
+        table = MeldTableWriter(self, name, theader[T_METADATA],
+                                existing=theader[T_INDICES])
+        self.tables[name] = table
+        return table
+
+    def finalize(self):
+        """
+        Add the new tables, objects and variables to the header.  Unlike
+        MeldWriter, nothing is written until the meld is closed.
+        """
+        for tname in self.tables:
+            table = self.tables[tname]
+            index = self._table_index(table)
+            if tname in self.header[H_TABLES]:
+                theader = self._reader._table_header(tname)
+                theader[T_VARIABLES].extend(table.variables)
+                theader[T_INDICES].update(index)
+                theader[T_VMETADATA].update(table._vmd)
+            else:
+                theader = {T_VARIABLES: table.variables,
+                           T_INDICES: index,
+                           T_METADATA: table._metadata,
+                           T_VMETADATA: table._vmd}
+                if not self.split:
+                    self.header[H_TABLES][tname] = theader
+            if self.split:
+                self.sections[tname] = theader
+                self.header[H_TABLES][tname] = {V_INDEX: V_INDHOLD,
+                                                V_LENGTH: V_INDHOLD}
+        for oname in self.objects:
+            self.header[H_OBJECTS][oname] = {V_INDEX: V_INDHOLD,
+                                             V_LENGTH: V_INDHOLD,
+                                             O_METADATA: self.objects[oname]}
+        self.defined = True
+
+    def _write_header(self):
+        """
+        Write the header to the end of the file and then point the
+        header at the start of the file to it.  This is only done once
+        all the new data has been written, so the meld is left as it
+        was otherwise.  If the header is split, the sections of the
+        tables that changed are written (before the header) and the
+        rest are left where they were.
+        """
+        if not self.defined or len(self._missing())>0:
+            return
+
+        self.fp.seek(0, 2)
+        for tname in sorted(self.sections):
+            bsec = self.ser.encode_obj(self.sections[tname], uncomp=True)
+            entry = self.header[H_TABLES][tname]
+            entry[V_INDEX] = long(self.fp.tell())
+            entry[V_LENGTH] = long(len(bsec))
+            self.fp.write(bsec)
+        bhead = self.ser.encode_obj(self.header, uncomp=True)
+        base = self.fp.tell()
+        write_len(self.fp, len(bhead))
+        self.fp.write(bhead)
+        self.fp.flush()
+
+        # The position is packed so the pointer always has the same size
+        bfront = self.ser.encode_obj({H_RELOC: struct.pack('!Q', base)},
+                                     uncomp=True)
+        if len(bfront)>self.headlen: # pragma: no cover
+            raise IOError("Header too small to relocate")
+        self.fp.seek(0)
+        self.fp.write(self.meld_id)
+        write_len(self.fp, len(bfront))
+        self.fp.write(bfront)
+        self.fp.seek(0, 2)
+
+    def __exit__(self, type, value, traceback):
+        if type==None:
+            self.close()
+            return
+        # Leave the meld as it was (anything appended is ignored)
+        self._stop_pool()
+        self.closed = True
+        if self.shouldClose:
+            self.fp.close()
+
+    def close(self):
+        """
+        Close this meld for any more writing (the new header is written
+        once all the new data has been written).
+        """
+        if not self.defined:
+            self.finalize()
+        MeldWriter.close(self)
+
 class MeldReader(object):
     """
     This class is used for reading melds
     """
-    def __init__(self, file, verbose=False, inmemory=False):
+    def __init__(self, file, verbose=False, inmemory=False, mmap=False,
+                 cache_size=DEFAULT_CACHE_SIZE):
         """
         Reads the header information (two reads, one for size and one
         for rest of header).
+
+        If mmap is True, the file is memory mapped and signal data is
+        decoded directly from (zero-copy) buffers into the mapping.
+        This requires a real file (not, e.g., a StringIO object).
+
+        The reader keeps (up to cache_size bytes of) the most recently
+        decoded vectors that are shared by several signals (i.e., that
+        have aliases) so that they are only decoded once.
         """
 
         # If a file name is passed, open the file...in *binary* mode
@@ -452,7 +1072,11 @@ class MeldReader(object):
 
         # Note, the inmemory option didn't seem to make any difference
         # in my basic benchmarks
-        if inmemory:
+        self.mm = None
+        if mmap:
+            self.mm = self._map(fp)
+            self.fp = fp
+        elif inmemory:
             import StringIO
             self.fp = StringIO.StringIO(fp.read())
             # If we opened this file pointer, we don't need it anymore.
@@ -462,23 +1086,34 @@ class MeldReader(object):
         else:
             self.fp = fp
         self.verbose = verbose
+        self.cache = LRUCache(cache_size, weigh=vector_size)
+        self.chunks = {} # (index, length) -> chunk index of a chunked vector
 
         self.ser = DEFSER(compress=False)
 
         lead = self.fp.read(len(MELD_ID)+4)
         
         file_id = lead[:-4]
-        if file_id != MELD_ID:
+        if not file_id in MELD_IDS:
             raise IOError("File is not a Meld file")
 
         blen = conv_len(lead[-4:])
         self.headlen = blen
         self.header = self.ser.decode_obj(self.fp, length=blen)
+        if H_RELOC in self.header:
+            # The header was relocated (by a MeldAppender)
+            self.fp.seek(struct.unpack('!Q', self.header[H_RELOC])[0])
+            self.headlen = read_len(self.fp)
+            self.header = self.ser.decode_obj(self.fp, length=self.headlen)
         self.metadata = self.header[H_METADATA]
         self.compression = self.header[H_COMP]
-        self.ser = DEFSER(compress=self.compression)
+        self.typed = self.header.get(H_TYPED, False)
+        self.split = self.header.get(H_SPLIT, False)
+        self.sections = {} # table name -> table data (if split)
+        self.ser = DEFSER(compress=self.compression, typed=self.typed)
         if self.verbose:
             print "Compression: "+str(self.compression)
+            print "Typed vectors: "+str(self.typed)
         if self.verbose:
             print "Header = "+str(self.header)
 
@@ -488,6 +1123,52 @@ class MeldReader(object):
     def __exit__(self, type, value, traceback):
         self.close()
 
+    def _map(self, fp):
+        """
+        Memory map (read-only) the file behind a file pointer
+        """
+        import mmap
+        return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _raw(self, ind, blen):
+        """
+        Returns the (still encoded) bytes for the data stored at the
+        given index with the given length.  When the file is memory
+        mapped, this is a buffer into the mapping (so no copy is made).
+        """
+        if self.mm!=None:
+            return buffer(self.mm, ind, blen)
+        self.fp.seek(ind)
+        return self.fp.read(blen)
+
+    def _table_header(self, table):
+        """
+        Header information about a given table.  If the header is
+        split, the section for the table is read the first time it is
+        needed.
+        """
+        if not self.split:
+            return self.header[H_TABLES][table]
+        if not table in self.sections:
+            entry = self.header[H_TABLES][table]
+            raw = self._raw(entry[V_INDEX], entry[V_LENGTH])
+            self.sections[table] = self.ser.load_obj(raw, uncomp=True)
+        return self.sections[table]
+
+    def set_cache_size(self, size):
+        """
+        Set the maximum number of bytes of decoded vectors held in the
+        cache (zero disables caching)
+        """
+        self.cache.resize(size)
+
+    def clear_cache(self):
+        """
+        Discard all decoded vectors held in the cache
+        """
+        self.cache.clear()
+        self.chunks.clear()
+
     def asJSON(self, fp):
         """
         This function outputs the wall file in a JSON like
@@ -525,12 +1206,12 @@ class MeldReader(object):
         ret["header"] = self.headlen
         
         for table in self.tables():
-            signals = self.header[H_TABLES][table][T_INDICES].keys()
+            indices = self._table_header(table)[T_INDICES]
             signal_map = {}
             tl = 0
-            for signal in signals:
-                ind = self.header[H_TABLES][table][T_INDICES][signal][V_INDEX]
-                blen = self.header[H_TABLES][table][T_INDICES][signal][V_LENGTH]
+            for signal in indices:
+                ind = indices[signal][V_INDEX]
+                blen = indices[signal][V_LENGTH]
                 if not ind in signal_map:
                     signal_map[ind] = [blen]
                     tl += blen
@@ -566,11 +1247,14 @@ class MeldReader(object):
         ind = self.header[H_OBJECTS][objname][V_INDEX]
         blen = self.header[H_OBJECTS][objname][V_LENGTH]
         metadata = self.header[H_OBJECTS][objname][O_METADATA]
-        self.fp.seek(ind)
-        data = self.ser.decode_obj(self.fp, blen)
+        data = self.ser.load_obj(self._raw(ind, blen))
         return MeldObjectReader(data, metadata)
 
     def close(self):
+        # Note, we don't explicitly close the memory map because numpy
+        # arrays returned by the table readers may still refer to it.
+        # It will be unmapped once the last of them is released.
+        self.mm = None
         if self.shouldClose:
             self.fp.close()
 
@@ -584,11 +1268,19 @@ class MeldTableReader(object):
         """
         self.reader = reader
         self.table = table
-        self.indices = self.reader.header[H_TABLES][table][T_INDICES]
-        self.signames = self.reader.header[H_TABLES][table][T_VARIABLES]
-        self.metadata = self.reader.header[H_TABLES][table][T_METADATA]
-        self.var_metadata = self.reader.header[H_TABLES][table][T_VMETADATA]
-
+        theader = self.reader._table_header(table)
+        self.indices = theader[T_INDICES]
+        self.signames = theader[T_VARIABLES]
+        self.metadata = theader[T_METADATA]
+        self.var_metadata = theader[T_VMETADATA]
+
+        # Locations of the data shared by several signals (only these
+        # are kept in the reader's cache)
+        counts = {}
+        for entry in self.indices.values():
+            loc = (entry[V_INDEX], entry[V_LENGTH])
+            counts[loc] = counts.get(loc, 0)+1
+        self._shared = set(filter(lambda x: counts[x]>1, counts))
 
     def signals(self):
         """
@@ -596,23 +1288,361 @@ class MeldTableReader(object):
         """
         return self.signames
 
-    def data(self, signal):
+    def _entry(self, signal):
         """
-        Data (in this table) associated with a specific signal name
+        Index entry for a given signal name
         """
         if not signal in self.indices:
             raise NameError("No signal named "+str(signal)+\
                                 " found in table "+str(self.table))
-        ind = self.indices[signal][V_INDEX]
-        blen = self.indices[signal][V_LENGTH]
-        trans = parse_transform(self.indices[signal].get(V_TRANS, None))
-        self.reader.fp.seek(ind)
-        data = self.reader.ser.decode_vec(self.reader.fp, blen)
+        return self.indices[signal]
+
+    def _decode(self, raw, as_array, entry):
+        """
+        Decode the (raw) bytes of a vector (using the codec and filters,
+        if any, given in its index entry)
+        """
+        codec = entry.get(V_COMP, None)
+        filters = entry.get(V_FILTER, None)
+        if as_array:
+            return self.reader.ser.load_array(raw, codec=codec,
+                                              filters=filters)
+        else:
+            return self.reader.ser.load_vec(raw, codec=codec,
+                                            filters=filters)
+
+    def _convert(self, data, as_array):
+        """
+        Data held in the cache as a new list (or numpy array, if
+        as_array is True).  Returns None if the data can't be converted
+        exactly (e.g., an array of strings).
+        """
+        if hasattr(data, "dtype"): # numpy array
+            if as_array:
+                return data.copy()
+            if data.dtype.kind in 'biuf':
+                return data.tolist()
+            return None
+        if as_array:
+            import numpy
+            return numpy.array(data)
+        return list(data)
+
+    def _fetch(self, loc, entry, as_array):
+        """
+        Decode the data at a location shared by several signals, using
+        the cache.  The data is kept in the cache in a single form
+        (numpy arrays for typed melds, lists otherwise) which is
+        converted to the form requested.  The caller always gets a
+        new object.
+        """
+        cached = self.reader.cache.get(loc)
+        if cached is not None:
+            data = self._convert(cached, as_array)
+            if data is not None:
+                return data
+
+        form = self.reader.typed
+        data = self._whole(entry, form)
+        # The cache keeps its own copy so that callers can modify data
+        self.reader.cache.put(loc, self._convert(data, form))
+        if form==as_array:
+            return data
+        ret = self._convert(data, as_array)
+        if ret is None:
+            ret = self._whole(entry, as_array)
+        return ret
+
+    def _chunk_index(self, entry):
+        """
+        The chunk index of a chunked vector, i.e., the number of values
+        and the index and length of each chunk
+        """
+        loc = (entry[V_INDEX], entry[V_LENGTH])
+        index = self.reader.chunks.get(loc, None)
+        if index is None:
+            index = self.reader.ser.load_obj(self.reader._raw(*loc),
+                                             uncomp=True)
+            self.reader.chunks[loc] = index
+        return index
+
+    def _read_chunks(self, entry, chunks, as_array, cache=False):
+        """
+        Decode a series of (contiguous) chunks, fetching any that are
+        not in the cache with a single read.  If cache is True, the
+        decoded chunks are added to the cache.
+        """
+        pieces = [None]*len(chunks)
+        todo = []
+        for (k, loc) in enumerate(chunks):
+            if cache:
+                piece = self.reader.cache.get(tuple(loc))
+                if piece is not None:
+                    pieces[k] = self._convert(piece, as_array)
+            if pieces[k] is None:
+                todo.append(k)
+        if len(todo)==0:
+            return pieces
+        start = chunks[todo[0]][0]
+        end = max(map(lambda k: chunks[k][0]+chunks[k][1], todo))
+        block = self.reader._raw(start, end-start)
+        for k in todo:
+            (ind, blen) = chunks[k]
+            pieces[k] = self._decode(buffer(block, ind-start, blen), as_array,
+                                     entry)
+            if cache:
+                # Decoded chunks are only ever joined (i.e., copied)
+                self.reader.cache.put((ind, blen), pieces[k])
+        return pieces
+
+    def _join(self, pieces, as_array):
+        """
+        Join decoded chunks into a single (new) vector
+        """
+        if as_array:
+            import numpy
+            if len(pieces)==0:
+                return numpy.array([])
+            return numpy.concatenate(pieces)
+        ret = []
+        for piece in pieces:
+            ret.extend(piece)
+        return ret
+
+    def _whole(self, entry, as_array, raw=None):
+        """
+        Decode all the data of a vector (raw, if given, holds the
+        stored bytes of vectors that are not chunked)
+        """
+        if not V_CHUNK in entry:
+            if raw is None:
+                raw = self.reader._raw(entry[V_INDEX], entry[V_LENGTH])
+            return self._decode(raw, as_array, entry)
+        chunks = self._chunk_index(entry)[C_CHUNKS]
+        return self._join(self._read_chunks(entry, chunks, as_array),
+                          as_array)
+
+    def _range(self, entry, as_array, start, stop):
+        """
+        Decode the values from start to stop of a chunked vector.  Only
+        the chunks holding those values are read.
+        """
+        index = self._chunk_index(entry)
+        (start, stop, step) = slice(start, stop).indices(index[C_COUNT])
+        if start>=stop:
+            return self._join([], as_array)
+        size = entry[V_CHUNK]
+        first = start//size
+        last = (stop-1)//size
+        pieces = self._read_chunks(entry, index[C_CHUNKS][first:last+1],
+                                   as_array, cache=True)
+        offset = first*size
+        return self._join(pieces, as_array)[start-offset:stop-offset]
+
+    def data(self, signal, as_array=False, start=None, stop=None):
+        """
+        Data (in this table) associated with a specific signal name.
+        If as_array is True, the data is returned as a numpy array
+        (decoded directly from the stored bytes, where possible).
 
+        If start or stop are given, only the values data[start:stop]
+        are returned.  For chunked signals, only the chunks holding
+        those values are read.
+        """
+        entry = self._entry(signal)
+        trans = parse_transform(entry.get(V_TRANS, None))
+        loc = (entry[V_INDEX], entry[V_LENGTH])
+        ranged = start!=None or stop!=None
+        if ranged and V_CHUNK in entry:
+            data = self._range(entry, as_array, start, stop)
+            ranged = False
+        elif loc in self._shared and self.reader.cache.size>0:
+            data = self._fetch(loc, entry, as_array)
+        else:
+            data = self._whole(entry, as_array)
+        if ranged:
+            data = data[start:stop]
         if trans==None:
             return data
+        return trans.apply(data)
+
+    def read_many(self, signals, as_array=False, gap=COALESCE_GAP,
+                  start=None, stop=None, max_run=COALESCE_MAX):
+        """
+        Data for several signals at once, returned as a dictionary
+        mapping signal names to data.  The stored vectors are read in
+        file order, vectors separated by no more than gap bytes are
+        fetched with a single read (of at most max_run bytes, unless a
+        single vector is longer than that) and vectors shared by several
+        signals (i.e., aliases) are only decoded once.  If start or
+        stop are given, only those values are returned (as in data).
+        """
+        import copy
+
+        ranged = start!=None or stop!=None
+
+        # Group the requested signals by where their data is stored
+        locs = {} # (index, length) -> [signal names]
+        for signal in signals:
+            entry = self._entry(signal)
+            loc = (entry[V_INDEX], entry[V_LENGTH])
+            if not loc in locs:
+                locs[loc] = []
+            locs[loc].append(signal)
+
+        # Anything already in the cache doesn't need to be read
+        decoded = {} # (index, length) -> data
+        for loc in locs.keys():
+            cached = self.reader.cache.get(loc)
+            if cached is None:
+                continue
+            data = self._convert(cached, as_array)
+            if data is None:
+                continue
+            if ranged:
+                data = data[start:stop]
+            decoded[loc] = data
+
+        # Chunked vectors are read chunk by chunk
+        for loc in locs.keys():
+            if loc in decoded:
+                continue
+            entry = self.indices[locs[loc][0]]
+            if V_CHUNK in entry and ranged:
+                decoded[loc] = self._range(entry, as_array, start, stop)
+            elif V_CHUNK in entry:
+                decoded[loc] = self._whole(entry, as_array)
+
+        # Coalesce nearby locations into runs, i.e., (start, end, [locations])
+        runs = []
+        for (ind, blen) in sorted(locs.keys()):
+            if (ind, blen) in decoded:
+                continue
+            if len(runs)>0 and ind-runs[-1][1]<=gap and \
+                   max(runs[-1][1], ind+blen)-runs[-1][0]<=max_run:
+                runs[-1][1] = max(runs[-1][1], ind+blen)
+                runs[-1][2].append((ind, blen))
+            else:
+                runs.append([ind, ind+blen, [(ind, blen)]])
+
+        for (base, end, members) in runs:
+            block = self.reader._raw(base, end-base)
+            for (ind, blen) in members:
+                entry = self.indices[locs[(ind, blen)][0]]
+                data = self._decode(buffer(block, ind-base, blen), as_array,
+                                    entry)
+                if ranged:
+                    data = data[start:stop]
+                decoded[(ind, blen)] = data
+
+        ret = {}
+        for loc in decoded:
+            data = decoded[loc]
+            first = True
+            for signal in locs[loc]:
+                trans = parse_transform(self.indices[signal].get(V_TRANS,
+                                                                 None))
+                if trans!=None:
+                    ret[signal] = trans.apply(data)
+                elif first:
+                    ret[signal] = data
+                    first = False
+                else:
+                    ret[signal] = copy.copy(data)
+        return ret
+
+    def _bisect(self, signal, value, right=False):
+        """
+        Position at which value would be inserted into the (sorted)
+        values of a signal to keep them sorted.  If right is True, the
+        position is after any values equal to value.  For chunked
+        signals, only the chunks visited by a binary search over the
+        chunks are read.
+        """
+        import bisect
+
+        find = bisect.bisect_right if right else bisect.bisect_left
+        entry = self._entry(signal)
+        if not V_CHUNK in entry:
+            return find(self.data(signal), value)
+
+        def after(x):
+            return x<value or (right and x==value)
+
+        # Find the first chunk whose last value isn't before value
+        size = entry[V_CHUNK]
+        n = self._chunk_index(entry)[C_COUNT]
+        lo = 0
+        hi = (n+size-1)//size
+        while lo<hi:
+            mid = (lo+hi)//2
+            if after(self.data(signal, start=mid*size,
+                               stop=(mid+1)*size)[-1]):
+                lo = mid+1
+            else:
+                hi = mid
+        if lo*size>=n:
+            return n
+        return lo*size+find(self.data(signal, start=lo*size,
+                                      stop=(lo+1)*size), value)
+
+    def data_decimated(self, signal, n_points):
+        """
+        An envelope of a signal with (at most) n_points points, returned
+        as lists of the minimums, maximums and means of consecutive
+        blocks of values.  If the signal has summaries that are fine
+        enough (i.e., have at least n_points blocks), the envelope is
+        built from the finest summaries that fit, without reading the
+        data of the signal.  Otherwise, it is computed from the data.
+        """
+        if n_points<1:
+            raise ValueError("Number of points must be positive")
+        entry = self._entry(signal)
+        if entry.get(V_SUMMARY, None):
+            raw = self.reader._raw(*entry[V_SUMMARY])
+            summaries = self.reader.ser.load_obj(raw)
+            if len(summaries[S_LEVELS][0][1])>=n_points:
+                for (size, mins, maxs, means) in summaries[S_LEVELS]:
+                    if len(mins)<=n_points:
+                        break
+                trans = parse_transform(entry.get(V_TRANS, None))
+                if trans==None:
+                    return (mins, maxs, means)
+                # A transform may swap the minimum and maximum
+                (tmins, tmaxs) = (trans.apply(mins), trans.apply(maxs))
+                return (map(min, tmins, tmaxs), map(max, tmins, tmaxs),
+                        trans.apply(means))
+
+        data = self.data(signal)
+        if len(data)<=n_points:
+            size = 1
+        else:
+            size = (len(data)+n_points-1)//n_points
+        envelope = summarize(data, size)
+        if envelope==None:
+            raise TypeError("Signal "+str(signal)+" is not numeric")
+        return envelope
+
+    def window(self, signals, t0, t1, abscissa="Time", as_array=False):
+        """
+        Data for several signals, restricted to the rows where the
+        abscissa lies between t0 and t1 (inclusive), returned as a
+        dictionary mapping signal names to data.  The abscissa must be
+        sorted.  The rows are found by a binary search of the abscissa
+        and, for chunked signals, only the chunks holding those rows
+        are read.
+        """
+        if V_CHUNK in self._entry(abscissa):
+            start = self._bisect(abscissa, t0)
+            stop = self._bisect(abscissa, t1, right=True)
         else:
-            return trans.apply(data)
+            # Decode the abscissa once for both searches
+            import bisect
+            values = self.data(abscissa)
+            start = bisect.bisect_left(values, t0)
+            stop = bisect.bisect_right(values, t1)
+        return self.read_many(signals, as_array=as_array, start=start,
+                              stop=max(start, stop))
 
 class MeldObjectReader(object):
     """
@@ -1,22 +1,401 @@
 import bz2
+import zlib
+import struct
 
-def compress(data):
+# Compression codecs, i.e., name -> (compress, decompress) where the
+# compress function takes the data and a compression level (None means
+# the codec's default level)
+CODECS = {}
+
+def register_codec(name, comp, decomp):
+    """
+    Make a compression codec available under the given name
+    """
+    CODECS[name] = (comp, decomp)
+
+# Note: a level of 0 is meaningful (e.g., no compression for zlib), so
+# the default level is only used if no level is given at all
+def _bz2_compress(data, level):
+    if level is None:
+        level = 9
+    return bz2.compress(data, level)
+def _zlib_compress(data, level):
+    if level is None:
+        level = 6
+    return zlib.compress(data, level)
+register_codec("bz2", _bz2_compress, lambda data: bz2.decompress(data))
+register_codec("zlib", _zlib_compress, lambda data: zlib.decompress(data))
+
+# The remaining codecs are only available if their modules are installed
+try: # pragma: no cover
+    try:
+        import lzma
+    except ImportError:
+        from backports import lzma
+    register_codec("lzma",
+                   lambda data, level: lzma.compress(data, preset=level),
+                   lambda data: lzma.decompress(str(data)))
+except ImportError: # pragma: no cover
+    pass
+
+try: # pragma: no cover
+    import lz4.frame
+    def _lz4_compress(data, level):
+        if level is None:
+            level = 0
+        return lz4.frame.compress(data, compression_level=level)
+    register_codec("lz4", _lz4_compress,
+                   lambda data: lz4.frame.decompress(str(data)))
+except ImportError: # pragma: no cover
+    pass
+
+try: # pragma: no cover
+    import zstandard
+    def _zstd_compress(data, level):
+        if level is None:
+            level = 3
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    def _zstd_decompress(data):
+        return zstandard.ZstdDecompressor().decompress(str(data))
+    register_codec("zstd", _zstd_compress, _zstd_decompress)
+except ImportError: # pragma: no cover
+    pass
+
+def codec_name(comp):
+    """
+    Helper function that converts a compression setting into the name
+    of a codec (or None if there is no compression).  For backwards
+    compatibility, True means bz2.
+    """
+    if comp==None or comp==False:
+        return None
+    if comp==True:
+        return "bz2"
+    if not comp in CODECS:
+        raise ValueError("Compression codec '"+str(comp)+"' is not available"+\
+                         " (options are: "+str(sorted(CODECS.keys()))+")")
+    return comp
+
+def compress(data, codec="bz2", level=None):
+    """
+    Helper function to compress data (using bz2, by default)
+    """
+    return CODECS[codec][0](data, level)
+
+def decompress(data, codec="bz2"):
+    """
+    Helper function to decompress data (using bz2, by default)
+    """
+    return CODECS[codec][1](data)
+
+class CodecSupport(object):
+    """
+    Compression related functionality shared by the serializers.  The
+    codec argument to these methods selects a codec other than the
+    default one for this serializer (False means no compression).
+    """
+    def _set_codec(self, comp, level=None):
+        self.compress = comp
+        self.codec = codec_name(comp)
+        self.level = level
+    def _codec(self, codec, uncomp):
+        if uncomp:
+            return None
+        if codec==None:
+            return self.codec
+        return codec_name(codec)
+    def _compress(self, data, codec=None, uncomp=False):
+        codec = self._codec(codec, uncomp)
+        if codec==None:
+            return data
+        # The level only applies to the default codec
+        if codec==self.codec:
+            return compress(data, codec, self.level)
+        return compress(data, codec)
+    def _decompress(self, data, codec=None, uncomp=False):
+        codec = self._codec(codec, uncomp)
+        if codec==None:
+            return data
+        return decompress(data, codec)
+
+def unpack_array(data):
+    """
+    Helper function to convert a msgpack encoded array directly into a
+    numpy array.  If the array consists entirely of double (or single)
+    precision floats, the values are extracted straight from the
+    encoded bytes without creating any intermediate Python objects.
+    Otherwise, None is returned.
+    """
+    import numpy
+
+    if len(data)==0:
+        return None
+
+    # Determine the number of elements and where they start
+    lead = ord(data[0])
+    if lead & 0xf0 == 0x90:
+        (n, off) = (lead & 0x0f, 1)
+    elif lead == 0xdc:
+        (n, off) = (struct.unpack('!H', data[1:3])[0], 3)
+    elif lead == 0xdd:
+        (n, off) = (struct.unpack('!L', data[1:5])[0], 5)
+    else:
+        return None
+    if n==0:
+        return None
+
+    # Each element is a one byte type tag followed by a big-endian value
+    for (tag, vtype) in ((0xcb, '>f8'), (0xca, '>f4')):
+        dtype = numpy.dtype([('t', 'u1'), ('v', vtype)])
+        if len(data)-off==n*dtype.itemsize and ord(data[off])==tag:
+            rec = numpy.frombuffer(data, dtype=dtype, count=n, offset=off)
+            if (rec['t']==tag).all():
+                return rec['v'].astype(numpy.float64)
+    return None
+
+def pack_float_array(x, single=False):
+    """
+    Helper function that is the inverse of unpack_array, i.e., it
+    encodes a (one dimensional) numpy array of floats as a msgpack
+    array without creating any intermediate Python objects.  The
+    result is the same as packing x.tolist() (with use_single_float
+    set to single).  Returns None for any other kind of array.
+    """
+    import numpy
+
+    if x.ndim!=1 or x.dtype.kind!='f' or len(x)==0:
+        return None
+    n = len(x)
+    if n<16:
+        head = chr(0x90 | n)
+    elif n<=0xffff:
+        head = struct.pack('!BH', 0xdc, n)
+    else:
+        head = struct.pack('!BL', 0xdd, n)
+    (tag, vtype) = (0xca, '>f4') if single else (0xcb, '>f8')
+    rec = numpy.empty(n, dtype=[('t', 'u1'), ('v', vtype)])
+    rec['t'] = tag
+    rec['v'] = x
+    return head+rec.tostring()
+
+def peek_key(data):
+    """
+    Helper function that extracts the key of a msgpack encoded map with
+    a single (string) key without decoding the value associated with
+    it.  Returns None if data (which may only be the first part of the
+    encoded map) doesn't start with such a map and key.
+    """
+    if len(data)<2 or ord(data[0])!=0x81:
+        return None
+    lead = ord(data[1])
+    if lead & 0xe0 == 0xa0:
+        (n, off) = (lead & 0x1f, 2)
+    elif (lead==0xd9 or lead==0xc4) and len(data)>=3:
+        (n, off) = (ord(data[2]), 3)
+    elif (lead==0xda or lead==0xc5) and len(data)>=4:
+        (n, off) = (struct.unpack('!H', data[2:4])[0], 4)
+    elif (lead==0xdb or lead==0xc6) and len(data)>=6:
+        (n, off) = (struct.unpack('!L', data[2:6])[0], 6)
+    else:
+        return None
+    if len(data)<off+n:
+        return None
+    return data[off:off+n]
+
+# Extension type code used for "typed" vectors, i.e., homogeneous
+# vectors stored as contiguous little-endian values
+TYPED_EXT = 1
+
+# Format characters used in typed vectors and their numpy equivalents
+TYPED_FORMATS = {'d': '<f8', 'f': '<f4', 'q': '<i8', '?': '|b1'}
+
+def pack_typed(x, single=False):
+    """
+    Helper function to encode a homogeneous list of floats, integers
+    or booleans as a msgpack extension whose payload is a format
+    character, the number of elements and then the raw (little-endian)
+    values.  Returns None if the list cannot be represented this way.
+    One dimensional numpy arrays of these types are accepted as well.
+    """
+    if hasattr(x, "dtype"): # numpy array
+        return pack_array(x, single=single)
+    if type(x)!=list or len(x)==0:
+        return None
+    # Note: subclasses (e.g., numpy.float64) are accepted as well
+    types = set(map(type, x))
+    if all(map(lambda t: issubclass(t, float), types)):
+        fmt = 'f' if single else 'd'
+    elif types==set([bool]):
+        fmt = '?'
+    elif all(map(lambda t: issubclass(t, (int, long)) and t!=bool, types)):
+        fmt = 'q'
+    else:
+        return None
+    try:
+        payload = struct.pack('<cQ%d%s' % (len(x), fmt), fmt, len(x), *x)
+    except (struct.error, OverflowError):
+        # Values don't fit (e.g., integers that require more than 64 bits)
+        return None
+    return typed_ext(payload)
+
+def pack_array(x, single=False):
+    """
+    Same as pack_typed, for a numpy array (the values are converted
+    to little-endian in a single step instead of one at a time)
+    """
+    import numpy
+
+    if x.ndim!=1 or len(x)==0:
+        return None
+    kind = x.dtype.kind
+    if kind=='f':
+        fmt = 'f' if single else 'd'
+    elif kind=='b':
+        fmt = '?'
+    elif kind=='i' or kind=='u':
+        fmt = 'q'
+        if kind=='u' and x.dtype.itemsize==8 and \
+               x.max()>numpy.uint64(0x7fffffffffffffff):
+            return None
+    else:
+        return None
+    values = numpy.ascontiguousarray(x, dtype=TYPED_FORMATS[fmt])
+    return typed_ext(struct.pack('<cQ', fmt, len(x))+values.tostring())
+
+def typed_ext(payload):
+    """
+    Helper function that wraps the payload of a typed vector in a
+    msgpack extension header
+    """
+    blen = len(payload)
+    if blen<=0xff:
+        head = struct.pack('!BBb', 0xc7, blen, TYPED_EXT)
+    elif blen<=0xffff:
+        head = struct.pack('!BHb', 0xc8, blen, TYPED_EXT)
+    else:
+        head = struct.pack('!BLb', 0xc9, blen, TYPED_EXT)
+    return head+payload
+
+def typed_info(data):
+    """
+    Helper function that checks whether some (decompressed) data
+    represents a typed vector.  If so, it returns a tuple containing
+    the format character, the number of elements and the offset of the
+    first value.  Otherwise, None is returned.
+    """
+    if len(data)<3:
+        return None
+    lead = ord(data[0])
+    if lead==0xc7:
+        off = 3
+    elif lead==0xc8:
+        off = 4
+    elif lead==0xc9:
+        off = 6
+    else:
+        return None
+    if struct.unpack_from('b', data, off-1)[0]!=TYPED_EXT:
+        return None
+    (fmt, n) = struct.unpack_from('<cQ', data, off)
+    return (fmt, n, off+struct.calcsize('<cQ'))
+
+def unpack_typed(data, info):
+    """
+    Helper function to convert a typed vector into a list
+    """
+    (fmt, n, off) = info
+    return list(struct.unpack_from('<%d%s' % (n, fmt), data, off))
+
+def unpack_typed_array(data, info):
+    """
+    Helper function to convert a typed vector into a (read-only)
+    numpy array that shares memory with data
+    """
+    import numpy
+    (fmt, n, off) = info
+    return numpy.frombuffer(data, dtype=TYPED_FORMATS[fmt],
+                            count=n, offset=off)
+
+# Filters that can be applied to the values in typed vectors before
+# they are compressed
+F_SHUFFLE = "shuffle"
+F_DELTA = "delta"
+
+def _shuffle(values, size, n):
     """
-    Helper function to compress data (using bz2)
+    Byte shuffle values, i.e., store the first byte of every value,
+    then the second byte of every value and so on
     """
-    c = bz2.BZ2Compressor()
-    a = c.compress(data)
-    b = c.flush()
-    return a+b
+    import numpy
+    return numpy.frombuffer(values, 'u1').reshape(n, size).T.tostring()
 
-def decompress(data):
+def _unshuffle(values, size, n):
     """
-    Helper function to decompress data (using bz2)
+    Undo _shuffle
     """
-    c = bz2.BZ2Decompressor()
-    return c.decompress(data)
+    import numpy
+    return numpy.frombuffer(values, 'u1').reshape(size, n).T.tostring()
 
-class BSONSerializer(object): # pragma: no cover
+def _delta(values, size, n):
+    """
+    Replace every value (treated as an unsigned integer of the same
+    size, so this is exact even for floating point values) with its
+    difference from the previous value
+    """
+    import numpy
+    x = numpy.frombuffer(values, '<u%d' % (size,))
+    return numpy.concatenate((x[:1], numpy.diff(x))).astype(x.dtype).tostring()
+
+def _undelta(values, size, n):
+    """
+    Undo _delta
+    """
+    import numpy
+    x = numpy.frombuffer(values, '<u%d' % (size,))
+    return numpy.cumsum(x, dtype=x.dtype).astype(x.dtype).tostring()
+
+FILTERS = {F_SHUFFLE: (_shuffle, _unshuffle),
+           F_DELTA: (_delta, _undelta)}
+
+def check_filters(filters):
+    """
+    Helper function that makes sure all filters are known
+    """
+    for f in filters:
+        if not f in FILTERS:
+            raise ValueError("Unknown filter '"+str(f)+"' (options are: "+\
+                             str(sorted(FILTERS.keys()))+")")
+
+def apply_filters(data, filters):
+    """
+    Helper function to apply filters (in order) to the values of a typed
+    vector.  Data that isn't a typed vector is returned unchanged.
+    """
+    info = typed_info(data)
+    if info==None or len(filters)==0:
+        return data
+    (fmt, n, off) = info
+    size = struct.calcsize('<'+fmt)
+    values = data[off:]
+    for f in filters:
+        values = FILTERS[f][0](values, size, n)
+    return data[:off]+values
+
+def remove_filters(data, filters):
+    """
+    Helper function to undo apply_filters
+    """
+    info = typed_info(data)
+    if info==None or len(filters)==0:
+        return data
+    (fmt, n, off) = info
+    size = struct.calcsize('<'+fmt)
+    values = data[off:]
+    for f in reversed(filters):
+        values = FILTERS[f][1](values, size, n)
+    return data[:off]+values
+
+class BSONSerializer(CodecSupport): # pragma: no cover
     """
     This class supports BSON serialization.  We started with this
     but found it very inefficient for arrays.  So we dropped it
@@ -25,24 +404,22 @@ class BSONSerializer(object): # pragma: no cover
     ** Deprecated **
 
     """
-    def __init__(self, compress=False, verbose=False, single=False):
+    def __init__(self, compress=False, verbose=False, single=False,
+                 typed=False, level=None):
         """
         Initialize settings for this serializer
         """
         from bson import BSON
 
         self.bson = BSON()
-        self.compress = compress
+        self._set_codec(compress, level)
         self.verbose = verbose
     def encode_obj(self, x, uncomp=False):
         """
         Encode an object (uncomp=True means suppress compression)
         """
         data = self.bson.encode(x)
-        if self.compress and not uncomp:
-            data = compress(data)
-            y = decompress(data) # Just to make sure it works
-        return data
+        return self._compress(data, uncomp=uncomp)
     def encode_vec(self, x, uncomp=False):
         """
         Encode a vector (uncomp=True means suppress compression)
@@ -54,28 +431,42 @@ class BSONSerializer(object): # pragma: no cover
         """
         Decode an object (uncomp=True means suppress decompression)
         """
+        return self.load_obj(fp.read(length), uncomp=uncomp,
+                             verbose=verbose)
+    def decode_vec(self, fp, length, uncomp=False):
+        """
+        Decode a vector (uncomp=True means suppress decompression)
+        """
+        return self.load_vec(fp.read(length), uncomp=uncomp)
+    def load_obj(self, data, uncomp=False, verbose=False):
+        """
+        Decode an object from bytes (uncomp=True means suppress
+        decompression)
+        """
         from bson import BSON
 
-        data = fp.read(length)
-        if self.compress and not uncomp:
-            data = decompress(data)
+        data = self._decompress(data, uncomp=uncomp)
         if verbose:
             print "Raw object data: "+str(repr(data))
         return BSON(data).decode()
-    def decode_vec(self, fp, length, uncomp=False):
+    def load_vec(self, data, uncomp=False):
         """
-        Decode a vector (uncomp=True means suppress decompression)
+        Decode a vector from bytes (uncomp=True means suppress
+        decompression)
         """
-        d = self.decode_obj(fp, length=length, uncomp=uncomp)
+        d = self.load_obj(data, uncomp=uncomp)
         return d["d"]
 
-class MsgPackSerializer(object):
-    def __init__(self, compress=False, single=False):
+class MsgPackSerializer(CodecSupport):
+    def __init__(self, compress=False, single=False, typed=False, level=None):
         """
-        Initialize various settings
+        Initialize various settings (typed=True means homogeneous
+        vectors are written as typed vectors, compress can be a codec
+        name and level is the compression level to use)
         """
-        self.compress = compress
+        self._set_codec(compress, level)
         self.single = single
+        self.typed = typed
     def encode_obj(self, x, verbose=False, uncomp=False):
         """
         Encode an object (uncomp=True means suppress compression)
@@ -83,43 +474,105 @@ class MsgPackSerializer(object):
         import msgpack
         try:
             data = msgpack.packb(x, use_single_float=self.single)
-            if self.compress and not uncomp:
-                data = compress(data)
-            return data
+            return self._compress(data, uncomp=uncomp)
         except Exception as e: # pragma: no cover
             print "Exception thrown while trying to pack '"+str(x)+"'"
             if type(x)==list:
                 print "  List contains: "+str(type(x[0]))
             raise e
-    def encode_vec(self, x, verbose=False, uncomp=False):
+    def encode_vec(self, x, verbose=False, uncomp=False, codec=None,
+                   filters=None):
         """
-        Encode a vector (uncomp=True means suppress compression)
+        Encode a vector (uncomp=True means suppress compression and
+        filters are applied to typed vectors before compression)
         """
-        return self.encode_obj(x, verbose=verbose, uncomp=uncomp)
+        data = None
+        if self.typed:
+            data = pack_typed(x, single=self.single)
+            if data!=None and filters:
+                data = apply_filters(data, filters)
+        if data==None and hasattr(x, "dtype"): # numpy array
+            data = pack_float_array(x, single=self.single)
+        if data==None:
+            if hasattr(x, "tolist"): # numpy array
+                x = x.tolist()
+            data = self.encode_obj(x, verbose=verbose, uncomp=True)
+        return self._compress(data, codec=codec, uncomp=uncomp)
     def decode_obj(self, fp, length, verbose=False, uncomp=False):
         """
         Decode an object (uncomp=True means suppress decompression)
         """
+        return self.load_obj(fp.read(length), verbose=verbose, uncomp=uncomp)
+    def decode_vec(self, fp, length, verbose=False, uncomp=False,
+                   codec=None, filters=None):
+        """
+        Decode a vector (uncomp=True means suppress decompression)
+        """
+        return self.load_vec(fp.read(length), verbose=verbose,
+                             uncomp=uncomp, codec=codec, filters=filters)
+    def decode_array(self, fp, length, verbose=False, uncomp=False,
+                     codec=None, filters=None):
+        """
+        Decode a vector as a numpy array (uncomp=True means suppress
+        decompression)
+        """
+        return self.load_array(fp.read(length), verbose=verbose,
+                               uncomp=uncomp, codec=codec, filters=filters)
+    def load_obj(self, data, verbose=False, uncomp=False):
+        """
+        Decode an object from bytes or a buffer (uncomp=True means
+        suppress decompression)
+        """
         import msgpack
-        data = fp.read(length)
-        if self.compress and not uncomp:
-            data = decompress(data)
+        data = self._decompress(data, uncomp=uncomp)
         x = msgpack.unpackb(data)
         return x
-    def decode_vec(self, fp, length, verbose=False, uncomp=False):
+    def load_vec(self, data, verbose=False, uncomp=False, codec=None,
+                 filters=None):
         """
-        Decode a vector (uncomp=True means suppress decompression)
+        Decode a vector from bytes or a buffer (uncomp=True means
+        suppress decompression and filters are those that were applied
+        when the vector was encoded)
+        """
+        import msgpack
+        data = self._decompress(data, codec=codec, uncomp=uncomp)
+        if filters:
+            data = remove_filters(data, filters)
+        info = typed_info(data)
+        if info!=None:
+            return unpack_typed(data, info)
+        return msgpack.unpackb(data)
+    def load_array(self, data, verbose=False, uncomp=False, codec=None,
+                   filters=None):
+        """
+        Decode a vector from bytes or a buffer as a numpy array
+        (uncomp=True means suppress decompression).  For uncompressed
+        (and unfiltered) typed vectors, the array shares memory with
+        data.
         """
-        return self.decode_obj(fp, length=length,
-                               verbose=verbose, uncomp=uncomp)
+        import numpy
+        import msgpack
+        data = self._decompress(data, codec=codec, uncomp=uncomp)
+        if filters:
+            data = remove_filters(data, filters)
+        info = typed_info(data)
+        if info!=None:
+            return unpack_typed_array(data, info)
+        x = unpack_array(data)
+        if x is None:
+            x = numpy.array(msgpack.unpackb(data))
+        return x
 
-class UMsgPackSerializer(object):
-    def __init__(self, compress=False, single=False):
+class UMsgPackSerializer(CodecSupport):
+    def __init__(self, compress=False, single=False, typed=False, level=None):
         """
-        Initialize various settings
+        Initialize various settings (typed=True means homogeneous
+        vectors are written as typed vectors, compress can be a codec
+        name and level is the compression level to use)
         """
-        self.compress = compress
+        self._set_codec(compress, level)
         self.single = single
+        self.typed = typed
     def encode_obj(self, x, verbose=False, uncomp=False):
         """
         Encode an object (uncomp=True means suppress compression)
@@ -133,37 +586,96 @@ class UMsgPackSerializer(object):
         
         try:
             data = umsgpack.packb(x)
-            if self.compress and not uncomp:
-                data = compress(data)
-            return data
+            return self._compress(data, uncomp=uncomp)
         except Exception as e: # pragma: no cover
             print "Exception thrown while trying to pack '"+str(x)+"'"
             if type(x)==list:
                 print "  List contains: "+str(type(x[0]))
             raise e
-    def encode_vec(self, x, verbose=False, uncomp=False):
+    def encode_vec(self, x, verbose=False, uncomp=False, codec=None,
+                   filters=None):
         """
-        Encode a vector (uncomp=True means suppress compression)
+        Encode a vector (uncomp=True means suppress compression and
+        filters are applied to typed vectors before compression)
         """
-        return self.encode_obj(x, verbose=verbose, uncomp=uncomp)
+        data = None
+        if self.typed:
+            data = pack_typed(x, single=self.single)
+            if data!=None and filters:
+                data = apply_filters(data, filters)
+        if data==None and hasattr(x, "dtype"): # numpy array
+            data = pack_float_array(x, single=self.single)
+        if data==None:
+            if hasattr(x, "tolist"): # numpy array
+                x = x.tolist()
+            data = self.encode_obj(x, verbose=verbose, uncomp=True)
+        return self._compress(data, codec=codec, uncomp=uncomp)
     def decode_obj(self, fp, length, verbose=False, uncomp=False):
         """
         Decode an object (uncomp=True means suppress decompression)
         """
+        return self.load_obj(fp.read(length), verbose=verbose, uncomp=uncomp)
+    def decode_vec(self, fp, length, verbose=False, uncomp=False,
+                   codec=None, filters=None):
+        """
+        Decode a vector (uncomp=True means suppress decompression)
+        """
+        return self.load_vec(fp.read(length), verbose=verbose,
+                             uncomp=uncomp, codec=codec, filters=filters)
+    def decode_array(self, fp, length, verbose=False, uncomp=False,
+                     codec=None, filters=None):
+        """
+        Decode a vector as a numpy array (uncomp=True means suppress
+        decompression)
+        """
+        return self.load_array(fp.read(length), verbose=verbose,
+                               uncomp=uncomp, codec=codec, filters=filters)
+    def load_obj(self, data, verbose=False, uncomp=False):
+        """
+        Decode an object from bytes or a buffer (uncomp=True means
+        suppress decompression)
+        """
         import umsgpack
         if self.single:
             umsgpack._float_size=32
         else:
             umsgpack._float_size=64
 
-        data = fp.read(length)
-        if self.compress and not uncomp:
-            data = decompress(data)
+        data = self._decompress(data, uncomp=uncomp)
         x = umsgpack.unpackb(data)
         return x
-    def decode_vec(self, fp, length, verbose=False, uncomp=False):
+    def load_vec(self, data, verbose=False, uncomp=False, codec=None,
+                 filters=None):
         """
-        Decode a vector (uncomp=True means suppress decompression)
+        Decode a vector from bytes or a buffer (uncomp=True means
+        suppress decompression and filters are those that were applied
+        when the vector was encoded)
+        """
+        import umsgpack
+        data = self._decompress(data, codec=codec, uncomp=uncomp)
+        if filters:
+            data = remove_filters(data, filters)
+        info = typed_info(data)
+        if info!=None:
+            return unpack_typed(data, info)
+        return umsgpack.unpackb(data)
+    def load_array(self, data, verbose=False, uncomp=False, codec=None,
+                   filters=None):
         """
-        return self.decode_obj(fp, length=length,
-                               verbose=verbose, uncomp=uncomp)
+        Decode a vector from bytes or a buffer as a numpy array
+        (uncomp=True means suppress decompression).  For uncompressed
+        (and unfiltered) typed vectors, the array shares memory with
+        data.
+        """
+        import numpy
+        import umsgpack
+        data = self._decompress(data, codec=codec, uncomp=uncomp)
+        if filters:
+            data = remove_filters(data, filters)
+        info = typed_info(data)
+        if info!=None:
+            return unpack_typed_array(data, info)
+        x = unpack_array(data)
+        if x is None:
+            x = numpy.array(umsgpack.unpackb(data))
+        return x
@@ -1,25 +1,42 @@
-from recon.wall import WallReader, WallWriter
+from recon.wall import WallReader, WallWriter, E_COLUMNS
 from recon.meld import MeldReader, MeldWriter
+from recon.serial import MsgPackSerializer, typed_info, TYPED_FORMATS
+from recon.dsres import DsresReader
 
-def wall2meld(wfp, mfp):
+import tempfile
+
+# Number of rows wall2meld buffers (per table) before spilling them
+SPILL_ROWS = 10000
+
+def wall2meld(wfp, mfp, spill_rows=SPILL_ROWS, chunk_size=None,
+              summaries=False):
     """
     This function reads a wall file in and converts it to a
     meld file.
+
+    The wall is read in a single pass.  Rows are buffered (at most
+    spill_rows per table) and then spilled, column by column, into a
+    temporary file.  Once the whole wall has been read, the columns
+    are read back from the temporary file and written to the meld.
+    If chunk_size is given, the signals in the meld are chunked and
+    each column is streamed into the meld one spilled segment at a
+    time.  Otherwise, each column is reassembled (as a numpy array,
+    if its values are all floats, integers or booleans) so only one
+    column needs to be held in memory at a time.  If summaries is
+    True, the meld includes summaries of the signals.
     """
     wall = WallReader(wfp)
-    meld = MeldWriter(mfp, metadata=wall.metadata)
+    meld = MeldWriter(mfp, metadata=wall.metadata, chunk_size=chunk_size,
+                      summaries=summaries)
 
     objects = {}
     tables = {}
 
-    # TODO: Add option to do overthing in memory? (to avoid multiple reads)
-    #       Simple implementation...copy wfp into a StringIO buffer and use that.
-
     # Step 1: Create definitions for meld
     #   Start with objects...
     for objname in wall.objects():
-        obj = wall.read_object(objname)
-        objects[objname] = meld.add_object(objname, metadata=obj.metadata)
+        metadata = wall.object_metadata(objname)
+        objects[objname] = meld.add_object(objname, metadata=metadata)
 
     #   ...then do tables
     for tabname in wall.tables():
@@ -39,34 +56,124 @@ def wall2meld(wfp, mfp):
     # Now that all definitions are made, we can finalize the meld
     meld.finalize()
 
-    # Step 2: Write actual data in meld
+    # Step 2: Make a single pass through the wall
+    ser = MsgPackSerializer(typed=True)
+    spill = tempfile.TemporaryFile()
+
+    fields = dict(map(lambda x: (x, {}), objects.keys())) # obj -> fields
+    rows = dict(map(lambda x: (x, []), tables.keys())) # table -> rows
+    segments = {} # table -> [[(offset, length) for each spill] per column]
+    for tabname in tables:
+        segments[tabname] = map(lambda x: [],
+                                wall.read_table(tabname).signals())
+
+    def flush_rows(tabname):
+        """
+        Spill the buffered rows of a table, column by column
+        """
+        if len(rows[tabname])==0:
+            return
+        for (col, vals) in enumerate(zip(*rows[tabname])):
+            data = ser.encode_vec(list(vals))
+            segments[tabname][col].append((spill.tell(), len(data)))
+            spill.write(data)
+        rows[tabname] = []
+
+    for (name, value) in wall.entries():
+        if name in rows:
+            if type(value)==dict: # Block of rows
+                rows[name].extend(zip(*value[E_COLUMNS]))
+            else:
+                rows[name].append(value)
+            if len(rows[name])>=spill_rows:
+                flush_rows(name)
+        elif name in fields:
+            fields[name].update(value)
+
+    # Step 3: Write actual data in meld
     #   Again, objects first...
-    for objname in wall.objects():
-        obj = wall.read_object(objname)
-        objects[objname].write(**(obj.data))
+    for objname in objects:
+        objects[objname].write(**(fields[objname]))
 
-    #   ...then tables
-    for tabname in wall.tables():
-        wtable = wall.read_table(tabname)
+    #   ...then tables, one column at a time
+    def pieces(segs):
+        for (off, blen) in segs:
+            spill.seek(off)
+            yield ser.decode_vec(spill, blen)
+
+    for tabname in tables:
+        flush_rows(tabname)
         mtable = tables[tabname]
-        for signal in wtable.signals():
-            mtable.write(signal, wtable.data(signal))
+        signals = wall.read_table(tabname).signals()
+        for (col, signal) in enumerate(signals):
+            segs = segments[tabname][col]
+            if chunk_size:
+                mtable.stream(signal, pieces(segs))
+                continue
+            vec = _spilled_array(spill, segs)
+            if vec is None:
+                vec = []
+                for piece in pieces(segs):
+                    vec.extend(piece)
+            mtable.write(signal, vec)
 
+    spill.close()
     meld.close()
 
-def dsres2meld(df, mfp, verbose=False, compression=True, single=True):
+def _spilled_array(spill, segs):
     """
-    This function reads in a file in 'dsres' format and then writes it
-    back out in meld format.  Note there is a dependency in this code
-    on numpy and dymat.
+    Reassemble a spilled column as a numpy array.  This is only
+    possible if all of the segments are typed vectors of the same
+    type (otherwise, None is returned).  The headers of the segments
+    are checked first so the array can be filled in place.
     """
+    # Enough for the extension header and the format and count
+    HEAD = 15
+
+    fmts = set()
+    total = 0
+    for (off, blen) in segs:
+        spill.seek(off)
+        info = typed_info(spill.read(min(blen, HEAD)))
+        if info==None:
+            return None
+        fmts.add(info[0])
+        total += info[1]
+    if len(fmts)!=1:
+        return None
+
     import numpy
-    from DyMat import DyMatFile
+    ret = numpy.empty(total, dtype=TYPED_FORMATS[fmts.pop()])
+    pos = 0
+    for (off, blen) in segs:
+        spill.seek(off)
+        data = spill.read(blen)
+        (fmt, n, start) = typed_info(data)
+        ret[pos:pos+n] = numpy.frombuffer(data, dtype=ret.dtype, count=n,
+                                          offset=start)
+        pos += n
+    return ret
 
+def dsres2meld(df, mfp, verbose=False, compression=True, single=True,
+               typed=False, workers=None, filters=False, chunk_size=None,
+               summaries=False):
+    """
+    This function reads in a file in 'dsres' format and then writes it
+    back out in meld format.  Note there is a dependency in this code
+    on numpy.  The dsres file is memory mapped, so each signal is only
+    read from it when it is written to the meld.  If workers is given,
+    signals are encoded and compressed by that many threads.  If
+    filters is True (which requires typed), the abscissa is delta
+    encoded and all signals are byte shuffled before compression.  If
+    chunk_size is given, the signals in the meld are chunked and if
+    summaries is True, the meld includes summaries of the signals.
+    """
     # Read dsres file
-    mf = DyMatFile(df)
+    mf = DsresReader(df)
     # Open a meld file to write to
-    meld = MeldWriter(mfp, compression=compression, single=single)
+    meld = MeldWriter(mfp, compression=compression, single=single,
+                      typed=typed, workers=workers, chunk_size=chunk_size,
+                      summaries=summaries)
 
     # Initialize a couple of internal data structures
     tables = {}
@@ -76,6 +183,13 @@ def dsres2meld(df, mfp, verbose=False, compression=True, single=True):
     # This is the key to use for "description" fields
     DESC = "desc"
 
+    # Filters for the abscissa (monotonic) and the other signals
+    afilters = None
+    sfilters = None
+    if filters:
+        afilters = ["delta", "shuffle"]
+        sfilters = ["shuffle"]
+
     # We loop over the blocks in the dsres file and each block
     # will end up being a table.
     for block in mf.blocks():
@@ -121,15 +235,18 @@ def dsres2meld(df, mfp, verbose=False, compression=True, single=True):
         tables[block] = meld.add_table("T"+str(block))
 
         # Add abscissa
-        tables[block].add_signal(aname, metadata={DESC: adesc})
+        tables[block].add_signal(aname, metadata={DESC: adesc},
+                                 filters=afilters)
 
         for signal in signals:
-            tables[block].add_signal(signal, metadata={DESC: mf.description(signal)})
+            tables[block].add_signal(signal, metadata={DESC: mf.description(signal)},
+                                     filters=sfilters)
 
         # Add aliases (and their metadata)
         for alias in aliases:
             transform = None
-            if alias[3]<0.0:
+            # The data written for the signal already includes its sign
+            if alias[3]*mf._vars[alias[2]][3]<0.0:
                 tables[block].add_alias(alias=alias[0], of=alias[2],
                                         transform="aff(-1,0)",
                                         metadata={DESC:mf.description(alias[0])})
@@ -143,16 +260,16 @@ def dsres2meld(df, mfp, verbose=False, compression=True, single=True):
     # Now loop again, this time with the intention to write data
     for block in mf.blocks():
         # Write abscissa for this block
+        # (the arrays are written as they are)
         (abscissa, aname, adesc) = mf.abscissa(block)
-        abscissa = list(abscissa.astype(numpy.float))
-        tables[block].write(aname, list(abscissa))
+        tables[block].write(aname, abscissa)
 
         signals = signal_map[block]
 
         # Then write signals (no need to write aliases)
         for signal in signals:
-            vec = list(mf.data(signal).astype(numpy.float))
-            tables[block].write(signal, vec)
+            tables[block].write(signal, mf.data(signal))
 
-    # Close the MeldWriter
+    # Close the MeldWriter (and the dsres file)
     meld.close()
+    mf.close()
@@ -1,5 +1,7 @@
 import struct
 import bz2
+import operator
+from collections import OrderedDict
 
 def write_len(fp, l):
     """
@@ -33,15 +35,246 @@ def read_len(fp, ignoreEOF=False, verbose=False):
     up = struct.unpack('!L', lbytes)
     return up[0]
 
+def vector_size(data):
+    """
+    The (approximate) number of bytes of memory used by a vector, i.e.,
+    a list or a numpy array
+    """
+    import sys
+    if hasattr(data, "nbytes"): # numpy array
+        return data.nbytes
+    return sys.getsizeof(data)+sum(map(sys.getsizeof, data))
+
+class LRUCache(object):
+    """
+    A simple cache that holds entries with a total weight of at most
+    'size', discarding the least recently used entries first.  By
+    default, each entry weighs one (so size is the number of entries)
+    but a function giving the weight of each value can be supplied.  A
+    size of zero disables the cache.
+    """
+    def __init__(self, size, weigh=None):
+        self.size = size
+        self.weigh = weigh
+        self.weight = 0
+        self.entries = OrderedDict() # key -> (value, weight)
+    def __len__(self):
+        return len(self.entries)
+    def __contains__(self, key):
+        return key in self.entries
+    def get(self, key):
+        """
+        Returns the value associated with key (or None if not present)
+        """
+        if not key in self.entries:
+            return None
+        entry = self.entries.pop(key)
+        self.entries[key] = entry
+        return entry[0]
+    def put(self, key, value):
+        """
+        Adds (or refreshes) an entry in the cache.  A value that weighs
+        more than the size of the cache is not added.
+        """
+        self._discard(key)
+        weight = 1 if self.weigh==None else self.weigh(value)
+        if weight>self.size:
+            return
+        self.entries[key] = (value, weight)
+        self.weight += weight
+        self._trim()
+    def resize(self, size):
+        """
+        Change the maximum total weight of the entries in the cache
+        """
+        self.size = size
+        self._trim()
+    def clear(self):
+        """
+        Discard all entries in the cache
+        """
+        self.entries.clear()
+        self.weight = 0
+    def _discard(self, key):
+        if key in self.entries:
+            self.weight -= self.entries.pop(key)[1]
+    def _trim(self):
+        while self.weight>max(self.size, 0):
+            self.weight -= self.entries.popitem(last=False)[1][1]
+
 # Transforms
 
 T_INV = "inv"
 T_AFF = "aff"
 
+# Types that transforms treat as numeric
+NUMERIC = frozenset([float, int, long])
+
+def element_types(data):
+    """
+    The set of (exact) types present in a list
+    """
+    return set(map(type, data))
+
+def summarize(data, size):
+    """
+    Summarize numeric data in blocks of size values, i.e., returns
+    lists of the minimum, maximum and mean of each block (or None if
+    the data isn't numeric).  The minimums and maximums are values
+    of the data (so integers stay integers).
+    """
+    if hasattr(data, "dtype"): # numpy array
+        return summarize_array(data, size)
+    for t in element_types(data):
+        if t==bool or not issubclass(t, (float, int, long)):
+            return None
+    try:
+        import numpy
+        array = numpy.array(data)
+        # Integers that don't fit in 64 bits end up as objects
+        if array.dtype.kind in 'fiu':
+            return summarize_array(array, size)
+    except ImportError: # pragma: no cover
+        pass
+    mins = []
+    maxs = []
+    means = []
+    for i in xrange(0, len(data), size):
+        block = data[i:i+size]
+        mins.append(min(block))
+        maxs.append(max(block))
+        means.append(float(sum(block))/len(block))
+    return (mins, maxs, means)
+
+def summarize_array(data, size):
+    """
+    Same as summarize, for a (one dimensional) numpy array
+    """
+    import numpy
+
+    if not data.dtype.kind in 'fiu':
+        return None
+    if len(data)==0:
+        return ([], [], [])
+    starts = numpy.arange(0, len(data), size)
+    counts = numpy.diff(numpy.append(starts, len(data)))
+    mins = numpy.minimum.reduceat(data, starts)
+    maxs = numpy.maximum.reduceat(data, starts)
+    means = numpy.add.reduceat(data.astype(float), starts)/counts
+    return (mins.tolist(), maxs.tolist(), means.tolist())
+
+def coarsen(summary, size, count, factor):
+    """
+    Combine every factor blocks of a summary (with blocks of size
+    values summarizing count values) into a single block
+    """
+    (mins, maxs, means) = summary
+    try:
+        import numpy
+        starts = numpy.arange(0, len(mins), factor)
+        # Number of values summarized by each block
+        counts = numpy.minimum(size, count-numpy.arange(len(means))*size)
+        cmins = numpy.minimum.reduceat(numpy.array(mins), starts)
+        cmaxs = numpy.maximum.reduceat(numpy.array(maxs), starts)
+        cmeans = numpy.add.reduceat(numpy.array(means)*counts, starts)/ \
+            numpy.add.reduceat(counts, starts)
+        if cmins.dtype.kind in 'fiu' and cmaxs.dtype.kind in 'fiu':
+            return (cmins.tolist(), cmaxs.tolist(), cmeans.tolist())
+    except ImportError: # pragma: no cover
+        pass
+    cmins = []
+    cmaxs = []
+    cmeans = []
+    for i in xrange(0, len(mins), factor):
+        cmins.append(min(mins[i:i+factor]))
+        cmaxs.append(max(maxs[i:i+factor]))
+        total = 0.0
+        n = 0
+        for k in xrange(i, min(i+factor, len(means))):
+            w = min(size, count-k*size)
+            total += means[k]*w
+            n += w
+        cmeans.append(total/n)
+    return (cmins, cmaxs, cmeans)
+
+def pyramid(data, size, factor):
+    """
+    Summaries of numeric data at several resolutions, i.e., a list of
+    (block size, mins, maxs, means) starting with blocks of size values
+    and growing by factor until there is a single block (or None if
+    the data isn't numeric)
+    """
+    summary = summarize(data, size)
+    if summary==None:
+        return None
+    return summary_levels(summary, size, len(data), factor)
+
+def summary_levels(summary, size, count, factor):
+    """
+    Same as pyramid, given the summary (in blocks of size values) of
+    count values
+    """
+    levels = [(size,)+summary]
+    while len(summary[0])>1:
+        summary = coarsen(summary, size, count, factor)
+        size = size*factor
+        levels.append((size,)+summary)
+    return levels
+
+def join_vectors(pieces):
+    """
+    Join a list of vectors (lists or numpy arrays) into a single vector
+    """
+    if len(pieces)==1:
+        return pieces[0]
+    if any(map(lambda x: hasattr(x, "dtype"), pieces)):
+        import numpy
+        return numpy.concatenate(pieces)
+    ret = []
+    for piece in pieces:
+        ret.extend(piece)
+    return ret
+
+def rechunk(pieces, size):
+    """
+    Generator that regroups the values of a series of vectors (lists
+    or numpy arrays) into vectors of size values (except for the last
+    one, which may be shorter)
+    """
+    buf = []
+    n = 0
+    for piece in pieces:
+        start = 0
+        while start<len(piece):
+            part = piece[start:start+size-n]
+            start += len(part)
+            buf.append(part)
+            n += len(part)
+            if n==size:
+                yield join_vectors(buf)
+                buf = []
+                n = 0
+    if n>0:
+        yield join_vectors(buf)
+
 class InvTransform:
     def __init__(self):
         pass
     def apply(self, data):
+        if hasattr(data, "dtype"): # numpy array
+            if data.dtype.kind=='b':
+                return ~data
+            if data.dtype.kind in 'fi':
+                return -data
+            return data # pragma: no cover
+
+        # Homogeneous lists are handled in a single call
+        types = element_types(data)
+        if types<=NUMERIC:
+            return map(operator.neg, data)
+        if types==set([bool]):
+            return map(operator.not_, data)
+
         def afunc(x):
             if type(x)==bool:
                 return not x
@@ -60,20 +293,38 @@ class AffineTransform:
         self.scale = scale
         self.offset = offset
     def apply(self, data):
+        if hasattr(data, "dtype"): # numpy array
+            if data.dtype.kind in 'fiu':
+                return data*self.scale+self.offset
+            return data # pragma: no cover
+
+        # Homogeneous lists are handled in a single pass
+        (scale, offset) = (self.scale, self.offset)
+        if element_types(data)<=NUMERIC:
+            return [x*scale+offset for x in data]
+
         def sfunc(x):
             # TODO: Are these sufficient?
             if type(x)==float or type(x)==int or type(x)==long:
-                return x*self.scale+self.offset
+                return x*scale+offset
             else: # pragma: no cover
                 return x
         return map(lambda x: sfunc(x), data)
 
+# Cache of parsed transforms (transform string -> transform object)
+_transforms = {}
+
 def parse_transform(t):
     if t==None:
         return None
     if type(t)!=str:
         return None
 
+    if not t in _transforms:
+        _transforms[t] = _parse_transform(t)
+    return _transforms[t]
+
+def _parse_transform(t):
     trans = t.replace(" ","")
 
     if trans==T_INV:
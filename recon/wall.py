@@ -1,11 +1,20 @@
+import sys
+import struct
+
 from serial import BSONSerializer, MsgPackSerializer, UMsgPackSerializer
+from serial import peek_key
 
-from util import write_len, read_len, parse_transform
+from util import write_len, read_len, parse_transform, LRUCache
 
 # This is a unique ID that every wall file starts with so
 # it can be identified/verified.
 WALL_ID = "recon:wall:v01"
 
+# Walls that may contain block entries start with this ID instead, so
+# that readers that don't know about them refuse these walls
+WALL_ID_V2 = "recon:wall:v02"
+WALL_IDS = [WALL_ID, WALL_ID_V2]
+
 #DEFSER = BSONSerializer
 DEFSER = MsgPackSerializer
 #DEFSER = UMsgPackSerializer
@@ -20,11 +29,41 @@ T_METADATA = "tmeta"
 T_VMETADATA = "vmeta"
 T_SIGNALS = "sigs"
 T_ALIASES = "als"
+T_ABSCISSA = "absc"
 
 # Aliases
 A_OF = "s"
 V_TRANS = "t"
 
+# Block entries
+E_COLUMNS = "cols"
+
+# Trailing index (written by close) and the pointer to it (always the
+# last entry) and abscissa marks.  These names are reserved.
+E_INDEX = "#idx"
+E_POINTER = "#ptr"
+E_MARK = "#mrk"
+RESERVED = [E_INDEX, E_POINTER, E_MARK]
+I_ENTRIES = "e"
+I_ROWS = "r"
+I_MARKS = "t"
+
+# Number of bytes read (at first) from each entry to find its name
+# when building the index of entries
+KEY_PEEK = 256
+
+# Minimum number of rows between the abscissa values recorded (by mark
+# entries and in the trailing index)
+DEFAULT_STRIDE = 1000
+
+# Maximum number of flushes waiting to be written by the background
+# thread of a WallWriter (when async_io is used)
+DEFAULT_QUEUE_SIZE = 16
+
+# Default number of decoded values (across all tables) kept in a
+# WallReader's cache
+DEFAULT_CACHE_SIZE = 4*1024*1024
+
 
 class FinalizedWall(Exception):
     """
@@ -45,11 +84,37 @@ class WallWriter(object):
     largely pythonic API for doing so.
     """
 
-    def __init__(self, file, metadata={}, verbose=False):
+    def __init__(self, file, metadata={}, verbose=False, batch=False,
+                 async_io=False, queue_size=DEFAULT_QUEUE_SIZE, index=False,
+                 stride=DEFAULT_STRIDE, blocks=False):
         """
         Constructor for a WallWriter.  The file-like object fp only
         needs to support the 'write' method.
 
+        If blocks is True, rows added with add_rows are written as a
+        single block entry (otherwise, as one entry per row).  Walls
+        with block entries can't be read by readers of the original
+        format, so they are marked with a different ID (WALL_ID_V2).
+        If batch is True (which requires blocks), flush also writes
+        consecutive rows of the same table as a single block entry.
+
+        If index is True, close writes an index of all entries (and
+        the number of rows in each table) at the end of the wall so
+        that readers don't have to scan the entries.  In this case,
+        the file-like object must also support the 'tell' method.
+
+        For tables with an abscissa, the abscissa value of (roughly)
+        every stride-th row is written in a mark entry (and recorded in
+        the index) so that readers can seek to the rows in a given
+        range, even while the wall is still being written.
+
+        If async_io is True, entries are encoded and written by a
+        background thread so that flush doesn't have to wait for them
+        to be written.  At most queue_size flushes can be waiting to
+        be written (after that, flush waits for the thread to catch
+        up).  Any error raised by the thread is raised again by the
+        next call to flush or close.
+
         Note: all metadata must be supplied at the time the wall
         file is created.
         """
@@ -70,8 +135,31 @@ class WallWriter(object):
         self._metadata = metadata
         self.buffered_rows = []
         self.buffered_fields = [] # [{objname -> {field -> value}}]
+        if batch and not blocks:
+            raise ValueError("Batching rows requires blocks=True")
+        self.batch = batch
+        self.blocks = blocks
         self.ser = DEFSER()
 
+        self.index = index
+        self._entries = {} # name -> [[offset, length]] (if index is True)
+        self._rows = {} # table name -> number of rows (if index is True)
+        self.stride = stride
+        self._marks = {} # table name -> [[abscissa value, entry number]]
+        self._since = {} # table name -> rows written since the last mark
+        self._counts = {} # name -> number of entries written
+
+        self.queue = None
+        self.thread = None
+        self._error = None # exc_info of an error in the background thread
+        if async_io:
+            import Queue
+            import threading
+            self.queue = Queue.Queue(queue_size)
+            self.thread = threading.Thread(target=self._run)
+            self.thread.daemon = True
+            self.thread.start()
+
     def __enter__(self):
         return self
 
@@ -87,15 +175,19 @@ class WallWriter(object):
             raise KeyError("Wall already contains a table named "+name)
         if name in self.objects:
             raise KeyError("Wall already contains an object named "+name)
+        if name in RESERVED:
+            raise KeyError("The name "+name+" is reserved")
 
-    def add_table(self, name, metadata=None):
+    def add_table(self, name, metadata=None, abscissa=None):
         """
         This adds a new table to the wall.  If the wall has been
         finalized, this will generated a FinalizedWall exception.  If
         the name is already used by either a table or object, a
         KeyError exception will be raised.  Otherwise, a
         WallTableWriter object will be returned by this method that
-        can be used to populate the table.
+        can be used to populate the table.  The abscissa, if given, is
+        the name of a signal (added later) whose values never decrease
+        (e.g., time).
 
         Note: All metadata must be supplied at the time when the table
         is created.
@@ -103,7 +195,7 @@ class WallWriter(object):
         if self.defined:
             raise FinalizedWall()
         self._check_name(name)
-        table = WallTableWriter(self, name, metadata)
+        table = WallTableWriter(self, name, metadata, abscissa)
         self.tables[name] = table
         return table
 
@@ -135,6 +227,19 @@ class WallWriter(object):
             raise NotFinalized("Must finalize the wall before adding rows")
         self.buffered_rows.append((name, row))
 
+    def _add_rows(self, name, columns):
+        """
+        This is an internal method called by the WallTableWriter
+        object to add a block of rows (given as columns) to the wall.
+        """
+        if not self.defined:
+            raise NotFinalized("Must finalize the wall before adding rows")
+        if self.blocks:
+            self.buffered_rows.append((name, {E_COLUMNS: columns}))
+        else:
+            self.buffered_rows.extend(map(lambda x: (name, list(x)),
+                                          zip(*columns)))
+
     def _add_fields(self, name, kwargs):
         """
         This is an internal method called by the WallObjectWriter
@@ -160,6 +265,12 @@ class WallWriter(object):
                              T_ALIASES: self.tables[table].aliases,
                              T_METADATA: self.tables[table]._metadata,
                              T_VMETADATA: self.tables[table]._vmd}
+            abscissa = self.tables[table].abscissa
+            if abscissa!=None:
+                if not abscissa in self.tables[table]._columns:
+                    raise NameError("Abscissa "+abscissa+\
+                                        " is not a signal in table "+table)
+                tables[table][T_ABSCISSA] = abscissa
             if self.verbose:
                 print table
                 print "Columns: "+str(self.tables[table].signals)
@@ -184,56 +295,215 @@ class WallWriter(object):
             print "String header length: "+str(len(str(header)))
             print "Binary header length: "+str(len(bhead))
             print "Binary header: "+repr(bhead)
-        self.fp.write(WALL_ID)
+        self.fp.write(WALL_ID_V2 if self.blocks else WALL_ID)
         write_len(self.fp, len(bhead))
         self.fp.write(bhead)
         self.defined = True
 
-    def flush(self):
+    def _batches(self, rows):
+        """
+        The given (buffered) rows with consecutive rows (and blocks of
+        rows) of the same table combined into blocks
+        """
+        ret = []
+        run = [] # consecutive rows and blocks of one table
+
+        def extend(columns, vals):
+            if columns==None:
+                return map(list, vals)
+            for (col, v) in zip(columns, vals):
+                col.extend(v)
+            return columns
+
+        def end_run():
+            if len(run)==1:
+                ret.append(run[0])
+            elif len(run)>1:
+                columns = None
+                rows = [] # consecutive rows (not in blocks)
+                for (name, value) in run:
+                    if type(value)==dict: # Block of rows
+                        if len(rows)>0:
+                            columns = extend(columns, zip(*rows))
+                            rows = []
+                        columns = extend(columns, value[E_COLUMNS])
+                    else:
+                        rows.append(value)
+                if len(rows)>0:
+                    columns = extend(columns, zip(*rows))
+                ret.append((run[0][0], {E_COLUMNS: columns}))
+            del run[:]
+
+        for entry in rows:
+            if len(run)>0 and entry[0]!=run[0][0]:
+                end_run()
+            run.append(entry)
+        end_run()
+        return ret
+
+    def flush(self, wait=False):
+        """
+        This flushes any pending rows of fields.  When async_io is
+        used, they are handed to the background thread and, if wait
+        is True, this waits until they (and anything flushed before
+        them) have been written.
+        """
+        rows = self.buffered_rows
+        fields = self.buffered_fields
+        self.buffered_rows = []
+        self.buffered_fields = []
+        if self.queue==None:
+            self._write_entries(rows, fields)
+            return
+        self._check_error()
+        self.queue.put((rows, fields))
+        if wait:
+            self.queue.join()
+            self._check_error()
+
+    def _run(self):
+        """
+        Body of the background thread (when async_io is used).  Writes
+        the entries of each flush until it is given None.
+        """
+        while True:
+            job = self.queue.get()
+            try:
+                if job==None:
+                    return
+                if self._error==None:
+                    self._write_entries(*job)
+            except:
+                self._error = sys.exc_info()
+            finally:
+                self.queue.task_done()
+
+    def _check_error(self):
+        """
+        Raise (in the calling thread) any error raised by the
+        background thread
+        """
+        if self._error!=None:
+            error = self._error
+            self._error = None
+            raise error[0], error[1], error[2]
+
+    def _write_entries(self, rows, fields):
         """
-        This flushes any pending rows of fields.
+        Encode and write entries for the given rows and fields
         """
-        for row in self.buffered_rows:
+        if self.batch:
+            rows = self._batches(rows)
+        for row in rows:
             if self.verbose:
                 print row
-            rowdata = self.ser.encode_obj({row[0]: row[1]})
-            write_len(self.fp, len(rowdata))
-            self.fp.write(rowdata)
-        for field in self.buffered_fields:
+            self._write_entry(row[0], row[1])
+            if type(row[1])==dict: # Block of rows
+                count = len(row[1][E_COLUMNS][0]) if row[1][E_COLUMNS] else 0
+            else:
+                count = 1
+            if self.index:
+                self._rows[row[0]] = self._rows.get(row[0], 0)+count
+            self._mark(row[0], row[1], count)
+        for field in fields:
             if self.verbose:
                 print field
-            fielddata = self.ser.encode_obj({field[0]: field[1]})
-            write_len(self.fp, len(fielddata))
-            self.fp.write(fielddata)
-        self.buffered_rows = []
-        self.buffered_fields = []
+            self._write_entry(field[0], field[1])
+
+    def _write_entry(self, name, value):
+        """
+        Write a single entry (and record where it is, if an index
+        is being kept)
+        """
+        data = self.ser.encode_obj({name: value})
+        write_len(self.fp, len(data))
+        self._counts[name] = self._counts.get(name, 0)+1
+        if self.index and name!=E_MARK:
+            if not name in self._entries:
+                self._entries[name] = []
+            self._entries[name].append([self.fp.tell(), len(data)])
+        self.fp.write(data)
+
+    def _mark(self, name, value, count):
+        """
+        Record the abscissa value of the first row in the entry just
+        written for the named table if at least stride rows have been
+        written since the last one was recorded.  The value is written
+        in a mark entry (so readers of a wall that is still being
+        written can use it) and kept for the index.
+        """
+        table = self.tables[name]
+        if table.abscissa==None or count==0:
+            return
+        since = self._since.get(name, None)
+        if since==None or since>=self.stride:
+            index = table._columns[table.abscissa]
+            if type(value)==dict: # Block of rows
+                first = value[E_COLUMNS][index][0]
+            else:
+                first = value[index]
+            self._write_entry(E_MARK, [name, first])
+            if self.index:
+                if not name in self._marks:
+                    self._marks[name] = []
+                self._marks[name].append([first, self._counts[name]-1])
+            since = 0
+        self._since[name] = since+count
+
+    def _write_index(self):
+        """
+        Write the index entry followed by the pointer to it.  The
+        offset is packed so the pointer entry always has the same size.
+        """
+        base = self.fp.tell()
+        index = {I_ENTRIES: self._entries, I_ROWS: self._rows,
+                 I_MARKS: self._marks}
+        data = self.ser.encode_obj({E_INDEX: index})
+        write_len(self.fp, len(data))
+        self.fp.write(data)
+        data = self.ser.encode_obj({E_POINTER: struct.pack('!Q', base)})
+        write_len(self.fp, len(data))
+        self.fp.write(data)
 
     def close(self):
+        # Wait for the background thread (if any) to write everything
+        # that has been flushed
+        if self.thread!=None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        # The index is written last (and only if all entries were)
+        if self.index and self.defined and self._error==None:
+            self._write_index()
         # We close the file pointer IF we created it.  Otherwise,
         # we do nothing
         if self.shouldClose:
             self.fp.close()
+        self._check_error()
 
 class WallTableWriter(object):
     """
     This class is used to add rows to a given wall.
     """
-    def __init__(self, writer, name, metadata):
+    def __init__(self, writer, name, metadata, abscissa=None):
         """
         This constructor is only called by the WallWriter class.
         """
         self.writer = writer
+        self.abscissa = abscissa
         self.signals = []
         self.aliases = {}
         self._metadata = metadata
         self._vmd = {}
         self._vtypes = {}
         self.name = name
+        self._columns = {} # signal -> column index
+        self._checks = [] # (column index, signal, type) for typed signals
 
     def _check_name(self, name):
         if name in self.aliases:
             raise KeyError("'"+name+"' is already the name of an alias in table "+self.name)
-        if name in self.signals:
+        if name in self._columns:
             raise KeyError("'"+name+"' is already the name of a signal in table "+self.name)
 
     def add_signal(self, signal, metadata=None, vtype=None):
@@ -244,13 +514,15 @@ class WallTableWriter(object):
         is added.
         """
         self._check_name(signal)
+        if vtype!=None and type(vtype)!=type:
+            raise TypeError("Type specifier '"+str(vtype)+"' is not a type")
+        self._columns[signal] = len(self.signals)
         self.signals.append(signal)
         if metadata!=None:
             self._vmd[signal]=metadata
         if vtype!=None:
-            if type(vtype)!=type:
-                raise TypeError("Type specifier '"+str(vtype)+"' is not a type")
             self._vtypes[signal] = vtype
+            self._checks.append((self._columns[signal], signal, vtype))
 
     def add_alias(self, alias, of, transform=None, metadata=None):
         """
@@ -289,21 +561,15 @@ class WallTableWriter(object):
         if len(args)==0:
             # If they specified keyword arguments, make sure they line
             # up exactly with the existing signals.
-            aset = set(kwargs.keys())
-            cset = set(self.signals)
-            if len(aset-cset)>0:
+            extra = filter(lambda x: not x in self._columns, kwargs)
+            if len(extra)>0:
                 raise KeyError("Values provided for undefined columns: "+\
-                                   str(aset-cset))
-            if len(cset-aset)>0:
-                raise KeyError("Missing values for columns: "+(cset-aset))
-            row = map(lambda x: kwargs[x], self.signals)
-
-            # Enforce any type constraints
-            for signal in self._vtypes:
-                if type(kwargs[signal])!=self._vtypes[signal]:
-                    raise TypeError("Value of '%s' (%s) doesn't match expected type %s" % \
-                                    (signal, str(kwargs[signal]), str(self._vtypes[signal])))
-            self.writer._add_row(self.name, row)
+                                   str(set(extra)))
+            if len(kwargs)!=len(self.signals):
+                missing = filter(lambda x: not x in kwargs, self.signals)
+                raise KeyError("Missing values for columns: "+\
+                                   str(set(missing)))
+            row = map(kwargs.__getitem__, self.signals)
         else:
             # For positional arguments, just make sure we have the
             # correct number.
@@ -311,16 +577,42 @@ class WallTableWriter(object):
             if len(args)!=len(self.signals):
                 raise ValueError("Expected %d values, got %d" % \
                                      (len(self.signals), len(args)))
-            
-            for idx in range(0,len(self.signals)):
-                signal = self.signals[idx]
-                if signal in self._vtypes:
-                    val = args[idx]
-                    if type(val)!=self._vtypes[signal]:
-                        raise TypeError("Value of '%s' (%s) doesn't match expected type %s" % \
-                                        (signal, str(val), str(self._vtypes[signal])))
+            row = args
+
+        # Enforce any type constraints (only typed signals are checked)
+        for (idx, signal, vtype) in self._checks:
+            val = row[idx]
+            if type(val)!=vtype:
+                raise TypeError("Value of '%s' (%s) doesn't match expected type %s" % \
+                                (signal, str(val), str(vtype)))
 
-            self.writer._add_row(self.name, args)
+        self.writer._add_row(self.name, row)
+
+    def add_rows(self, rows):
+        """
+        This method adds several rows at once.  The rows can be given
+        as a list of rows (each a list of values in signal order) or as
+        a two dimensional numpy array.  They are written to the wall as
+        a single block entry (if the wall allows block entries).
+        """
+        if hasattr(rows, "tolist"): # numpy array
+            rows = rows.tolist()
+        for row in rows:
+            if len(row)!=len(self.signals):
+                raise ValueError("Expected %d values, got %d" % \
+                                     (len(self.signals), len(row)))
+        if len(rows)==0:
+            return
+        columns = map(list, zip(*rows))
+
+        # Enforce any type constraints (only typed signals are checked)
+        for (idx, signal, vtype) in self._checks:
+            for val in columns[idx]:
+                if type(val)!=vtype:
+                    raise TypeError("Value of '%s' (%s) doesn't match expected type %s" % \
+                                    (signal, str(val), str(vtype)))
+
+        self.writer._add_rows(self.name, columns)
 
 class WallObjectWriter(object):
     """
@@ -339,14 +631,24 @@ class WallObjectWriter(object):
         """
         self.writer._add_fields(self.name, kwargs)
 
+def decoded_size(state):
+    """
+    The number of values in the decoded columns of a table
+    """
+    return sum(map(len, state[1]))
+
 class WallReader(object):
     """
     This class is used to read a wall file.
     """
-    def __init__(self, file, verbose=False):
+    def __init__(self, file, verbose=False, cache_size=DEFAULT_CACHE_SIZE):
         """
         This is the constructor for the wall reader.  The file like
         'fp' object must support the read, tell and seek methods.
+
+        The reader keeps the decoded columns of the most recently read
+        tables (up to cache_size values in total) so that their
+        entries are only decoded once.
         """
 
         # If a file name is passed, open the file...in *binary* mode
@@ -365,7 +667,7 @@ class WallReader(object):
         # Read the first few bytes to make sure they contain the expected
         # string.
         id = self.fp.read(len(WALL_ID))
-        if id!=WALL_ID:
+        if not id in WALL_IDS:
             raise IOError("Invalid format: File is not a wall file ("+id+")")
 
         # Now read the length of the header object
@@ -382,6 +684,21 @@ class WallReader(object):
         # Record where the end of the header is.
         self.start = fp.tell()
 
+        # Index of entries (entity name -> list of (offset, length)).  This
+        # is built lazily, the first time any entries are requested.
+        self._index = None
+        # Offset just after the last entry in the index
+        self._tail = self.start
+        # Decoded columns of tables, i.e., table name -> [number of
+        # entries decoded, columns]
+        self._decoded = LRUCache(cache_size, weigh=decoded_size)
+        # Number of rows in each table (only known if the wall has a
+        # trailing index)
+        self._rows = None
+        # Abscissa values of some rows, as a list of (value, entry number)
+        # for each table with an abscissa
+        self._marks = {}
+
     def __enter__(self):
         return self
 
@@ -432,34 +749,324 @@ class WallReader(object):
         """
         return self.header[H_TABLES]
 
-    def _read_entries(self, name):
+    def _scan(self, start=None, keys=False):
         """
-        Since this file format is journaled, this internal method is
-        used to sweep through entries and find the ones that match the
-        named entity.  Only the matching objects are retained and
-        returned to the caller for processing.
+        Since this file format is journaled, this internal generator
+        sweeps through all entries (from the end of the header or from
+        start, if given) and yields the offset, length and (decoded)
+        value of each one.  A partially written entry at the end of
+        the file (e.g., one that is still being written) is ignored.
+
+        If keys is True, only the name of the entity is read from most
+        entries and the value yielded for them is {name: None}.  Only
+        (small) mark entries are still decoded.
         """
-        ret = []
+        # Entries added after this point are left for a later scan
+        self.fp.seek(0, 2)
+        end = self.fp.tell()
 
         # Position the file just after the header
-        self.fp.seek(self.start)
+        if start==None:
+            start = self.start
+        self.fp.seek(start)
 
         # Read the next object
         rowlen = read_len(self.fp, ignoreEOF=True, verbose=self.verbose)
         while rowlen!=None:
+            base = self.fp.tell()
+            if base+rowlen>end:
+                break
+            row = None
+            if keys:
+                name = peek_key(self.fp.read(min(rowlen, KEY_PEEK)))
+                if name!=None and name!=E_MARK:
+                    row = {name: None}
+                else:
+                    self.fp.seek(base)
+            if row==None:
+                data = self.fp.read(rowlen)
+                row = self.ser.load_obj(data, verbose=self.verbose)
+            yield (base, rowlen, row)
+            self.fp.seek(base+rowlen)
+            rowlen = read_len(self.fp, ignoreEOF=True, verbose=self.verbose)
+
+    def entries(self):
+        """
+        Generator that yields a (name, value) pair for every entry in
+        the wall, in the order they were written.  The name is the
+        name of the entity (table or object) and the value is either a
+        row, a block of rows (a map with the columns of the rows under
+        E_COLUMNS) or a collection of fields.
+        """
+        for (base, rowlen, row) in self._scan():
+            for name in row:
+                if name in RESERVED:
+                    continue
+                yield (name, row[name])
+
+    def _build_index(self):
+        """
+        This internal method uses the index written at the end of the
+        wall, if there is one.  Otherwise, it sweeps through all
+        entries (once) and records the offset and length of each one,
+        keyed by the name of the entity (table or object) it applies
+        to.
+        """
+        if self._load_index():
+            return
+        self._index = {}
+        self._marks = {}
+        self._decoded.clear()
+        self._tail = self.start
+        for entry in self._scan(keys=True):
+            self._add_entry(*entry)
+
+    def _load_index(self):
+        """
+        Try to load the index written at the end of the wall by
+        WallWriter.close.  Returns False (without changing anything)
+        if there is no such index or it isn't consistent with the file.
+        """
+        plen = len(self.ser.encode_obj({E_POINTER: struct.pack('!Q', 0)}))
+        self.fp.seek(0, 2)
+        end = self.fp.tell()
+        ptr = end-plen-4 # Start of the pointer entry
+        if ptr<self.start:
+            return False
+        self.fp.seek(ptr)
+        if read_len(self.fp)!=plen:
+            return False
+        try:
+            entry = self.ser.load_obj(self.fp.read(plen))
+            base = struct.unpack('!Q', entry[E_POINTER])[0]
+            if base<self.start or base>ptr-4:
+                return False
+            self.fp.seek(base)
+            ilen = read_len(self.fp)
+            if base+4+ilen!=ptr:
+                return False
+            index = self.ser.decode_obj(self.fp, length=ilen)[E_INDEX]
+            entries = index[I_ENTRIES]
+            rows = index[I_ROWS]
+            marks = index.get(I_MARKS, {})
+        except Exception:
+            # Whatever is at the end of the file, it isn't an index
+            return False
+
+        # All the entries must be between the header and the index
+        for name in entries:
+            for (offset, length) in entries[name]:
+                if offset<self.start+4 or offset+length>base:
+                    return False
+        for name in marks:
+            for (value, entry) in marks[name]:
+                if entry>=len(entries.get(name, [])):
+                    return False
+        if self.verbose:
+            print "Using index at "+str(base)
+        self._index = entries
+        self._rows = rows
+        self._marks = marks
+        self._tail = end
+        return True
+
+    def _add_entry(self, base, rowlen, row):
+        """
+        Add an entry to the index
+        """
+        # All entries have a single key which is the name of the entity
+        # (table or object) that they apply to.
+        for name in row:
+            if name==E_MARK:
+                # The abscissa value of the first row in the last entry
+                # of a table
+                (table, first) = row[name]
+                if len(self._index.get(table, []))>0:
+                    if not table in self._marks:
+                        self._marks[table] = []
+                    self._marks[table].append((first,
+                                               len(self._index[table])-1))
+                continue
+            if name in RESERVED:
+                continue
+            if not name in self._index:
+                self._index[name] = []
+            self._index[name].append((base, rowlen))
+        self._tail = base+rowlen
+
+    def poll(self):
+        """
+        Reads any entries added to the wall (e.g., by a simulation that
+        is still running) since the last call to poll (or since the
+        entries were first read).  These entries are added to the index
+        (so table readers will include them) and are returned as a
+        dictionary mapping entity names to a list of new rows (for
+        tables) or field values (for objects).  Only the new entries
+        are read and a partially written entry at the end of the wall
+        is left for a later call.
+        """
+        if self._index==None:
+            self._index = {}
+            self._marks = {}
+        ret = {}
+        for (base, rowlen, row) in self._scan(self._tail):
+            self._add_entry(base, rowlen, row)
+            for name in row:
+                if name in RESERVED:
+                    continue
+                if not name in ret:
+                    ret[name] = []
+                value = row[name]
+                if name in self.header[H_TABLES] and type(value)==dict:
+                    # Block of rows
+                    ret[name].extend(map(list, zip(*value[E_COLUMNS])))
+                else:
+                    ret[name].append(value)
+        return ret
+
+    def follow(self, interval=1.0, timeout=None):
+        """
+        Generator that calls poll every interval seconds and yields
+        its result whenever new entries were found.  If timeout is
+        given, it stops once no new entries have been found for that
+        many seconds.
+        """
+        import time
+
+        last = time.time()
+        while True:
+            ret = self.poll()
+            if len(ret)>0:
+                last = time.time()
+                yield ret
+            elif timeout!=None and time.time()-last>=timeout:
+                return
+            else:
+                time.sleep(interval)
+
+    def row_count(self, name):
+        """
+        The number of rows in the named table.  This is taken from the
+        index written at the end of the wall, if there is one.
+        Otherwise, the entries of the table are read to count them.
+        """
+        if self._index==None:
+            self._build_index()
+        if self._rows!=None:
+            return self._rows.get(name, 0)
+        count = 0
+        for entry in self._read_entries(name):
+            if type(entry)==dict: # Block of rows
+                count += len(entry[E_COLUMNS][0]) if entry[E_COLUMNS] else 0
+            else:
+                count += 1
+        return count
+
+    def _entry_range(self, name, t0, t1):
+        """
+        The range (first, last) of the entries of the named table that
+        can hold rows with abscissa values between t0 and t1 (either
+        can be None), found by a binary search of the recorded abscissa
+        values.
+        """
+        import bisect
+
+        if self._index==None:
+            self._build_index()
+        marks = self._marks.get(name, [])
+        values = map(lambda x: x[0], marks)
+        first = 0
+        last = None
+        if t0!=None:
+            # Rows at t0 can be in the entry before the first mark at t0
+            i = bisect.bisect_left(values, t0)
+            if i>0:
+                first = marks[i-1][1]
+        if t1!=None:
+            i = bisect.bisect_right(values, t1)
+            if i<len(marks):
+                last = marks[i][1]
+        return (first, last)
+
+    def set_cache_size(self, size):
+        """
+        Set the maximum number of decoded values held in the cache
+        (zero disables caching)
+        """
+        self._decoded.resize(size)
+
+    def clear_cache(self):
+        """
+        Discard all decoded columns held in the cache
+        """
+        self._decoded.clear()
+
+    def _table_columns(self, name):
+        """
+        The columns (one list per signal) of the named table.  While
+        the columns are in the cache, only entries added since they
+        were decoded (e.g., by poll) are decoded.  The lists returned
+        are shared and must not be modified.
+        """
+        if self._index==None:
+            self._build_index()
+        state = self._decoded.get(name)
+        if state==None:
+            signals = self.header[H_TABLES][name][T_SIGNALS]
+            state = [0, map(lambda x: [], signals)]
+        cols = state[1]
+        rows = [] # consecutive rows (not in blocks)
+
+        def transpose():
+            for (col, vals) in zip(cols, zip(*rows)):
+                col.extend(vals)
+            del rows[:]
+
+        entries = self._read_entries(name, state[0])
+        for entry in entries:
+            if type(entry)==dict: # Block of rows
+                transpose()
+                for (col, vals) in zip(cols, entry[E_COLUMNS]):
+                    col.extend(vals)
+            else:
+                rows.append(entry)
+        transpose()
+        state[0] += len(entries)
+        self._decoded.put(name, state)
+        return cols
+
+    def _read_entries(self, name, first=0, last=None):
+        """
+        This internal method uses the entry index to find the entries
+        that match the named entity.  Only the matching entries (from
+        first up to, but not including, last) are decoded and returned
+        to the caller for processing.
+        """
+        if self._index==None:
+            self._build_index()
+
+        ret = []
+        for (base, rowlen) in self._index.get(name, [])[first:last]:
+            # Entries for one entity are often contiguous, so avoid
+            # seeking when we are already in the right place.
+            if self.fp.tell()!=base:
+                self.fp.seek(base)
             row = self.ser.decode_obj(self.fp, length=rowlen,
                                       verbose=self.verbose)
-            #if self.verbose:
-            #    print "row = "+str(row)
-            # All entries have a single key which is the name of the entity
-            # (table or object) that they apply to.  So this basically extracts
-            # the value from each entity and appends it to an array which will
-            # be returned.
-            if name in row:
-                ret.append(row[name])
-            rowlen = read_len(self.fp, ignoreEOF=True, verbose=self.verbose)
+            ret.append(row[name])
         return ret
 
+    def object_metadata(self, name):
+        """
+        The metadata associated with the named object (this doesn't
+        require reading any entries)
+        """
+        if not name in self.header[H_OBJECTS]:
+            raise KeyError("No object named "+name+ \
+                               " present, options are: %s" % \
+                               (str(self.header[H_OBJECTS]),))
+        return self.header[H_OBJECTS][name]
+
     def read_object(self, name):
         """
         This method extracts the named object.
@@ -500,6 +1107,9 @@ class WallTableReader(object):
         self.header = header
         self.metadata = self.header[T_METADATA]
         self.var_metadata = self.header[T_VMETADATA]
+        # Signal name -> column index
+        self._columns = dict(map(lambda x: (x[1], x[0]),
+                                 enumerate(self.header[T_SIGNALS])))
     def signals(self):
         """
         Signals in this table
@@ -539,26 +1149,100 @@ class WallTableReader(object):
     def vmetadata(self, name):
         return self.var_metadata.get(name, None)
 
-    def data(self, name):
+    def _resolve(self, name):
         """
-        Get the data for a given variable (signal or alias)
+        Determine the column index and transform (if any) associated
+        with a given variable (signal or alias)
         """
-        if name in self.header[T_SIGNALS]:
-            signal = name
-            trans = None
+        if name in self._columns:
+            return (self._columns[name], None)
         elif name in self.header[T_ALIASES]:
             signal = self.header[T_ALIASES][name][A_OF]
-            trans = self.alias_transform(name)
+            return (self._columns[signal], self.alias_transform(name))
         else:
             raise NameError("No signal or alias named "+name)
-        ret = []
-        index = self.header[T_SIGNALS].index(signal)
-        ret = map(lambda x: x[index],
-                  self.reader._read_entries(self.name))
+
+    def nrows(self):
+        """
+        Number of rows in this table
+        """
+        return self.reader.row_count(self.name)
+
+    def abscissa(self):
+        """
+        The abscissa of this table (or None if it doesn't have one)
+        """
+        return self.header.get(T_ABSCISSA, None)
+
+    def data(self, name, t0=None, t1=None, abscissa=None):
+        """
+        Get the data for a given variable (signal or alias).  If t0
+        and/or t1 are given, only the rows where the abscissa (which
+        defaults to the abscissa of the table) lies between t0 and t1
+        (inclusive) are included.  For the abscissa of the table, only
+        the entries that can hold those rows (according to the mark
+        entries in the wall) are read.
+        """
+        (index, trans) = self._resolve(name)
+        if t0==None and t1==None:
+            ret = list(self.reader._table_columns(self.name)[index])
+        else:
+            if abscissa==None:
+                abscissa = self.abscissa()
+            if abscissa==None:
+                raise NameError("No abscissa given for table "+self.name)
+            (aindex, atrans) = self._resolve(abscissa)
+            if abscissa==self.abscissa():
+                (first, last) = self.reader._entry_range(self.name, t0, t1)
+            else:
+                (first, last) = (0, None)
+            vals = []
+            avals = []
+            for entry in self.reader._read_entries(self.name, first, last):
+                if type(entry)==dict: # Block of rows
+                    vals.extend(entry[E_COLUMNS][index])
+                    avals.extend(entry[E_COLUMNS][aindex])
+                else:
+                    vals.append(entry[index])
+                    avals.append(entry[aindex])
+            if atrans!=None:
+                avals = atrans.apply(avals)
+            ret = []
+            for (a, v) in zip(avals, vals):
+                if (t0==None or a>=t0) and (t1==None or a<=t1):
+                    ret.append(v)
         if trans==None:
             return ret
         else:
             return trans.apply(ret)
+
+    def columns(self, names=None, as_array=False):
+        """
+        Get the data for several variables (signals or aliases) at
+        once.  Each row is decoded exactly once and then transposed
+        into columns.  If no names are given, all variables in the
+        table are returned.  The result is a dictionary mapping
+        variable names to lists (or numpy arrays, if as_array is True).
+        """
+        if names==None:
+            names = self.variables()
+
+        # Resolve all the names up front so we fail before reading anything
+        plan = map(lambda x: (x,)+self._resolve(x), names)
+
+        cols = self.reader._table_columns(self.name)
+
+        ret = {}
+        for (name, index, trans) in plan:
+            col = list(cols[index])
+            if trans!=None:
+                col = trans.apply(col)
+            ret[name] = col
+
+        if as_array:
+            import numpy
+            for name in ret:
+                ret[name] = numpy.array(ret[name])
         return ret
 
 class WallObjectReader(object):
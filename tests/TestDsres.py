@@ -0,0 +1,104 @@
+from recon.dsres import DsresReader, PRECISIONS
+
+from nose.tools import *
+import struct
+import os
+
+def write_matrix(fp, name, data, prec=0, text=False, order='<'):
+    # Write a MATLAB v4 matrix (given as a list of rows)
+    import numpy
+
+    a = numpy.array(data)
+    mtype = (1000 if order=='>' else 0)+prec*10+(1 if text else 0)
+    fp.write(struct.pack(order+'5i', mtype, a.shape[0], a.shape[1], 0,
+                         len(name)+1))
+    fp.write(name+'\x00')
+    fp.write(a.T.astype(order+PRECISIONS[prec]).tostring())
+
+def chars(strings):
+    # Character matrix with one (padded) string per row
+    width = max(map(len, strings))
+    return map(lambda s: map(ord, s.ljust(width)), strings)
+
+def write_normal(dfile, order='<'):
+    # Write a (small) dsres file in the "binNormal" form
+    names = ["time", "x", "y", "p", "nx"]
+    descs = ["Time [s]", "State", "", "Parameter", "Negated x"]
+    info = [[0, 1, 0, 0], [2, 2, 0, -1], [2, 3, 0, -1], [1, 2, 0, 0],
+            [2, -2, 0, -1]]
+    with open(dfile, "wb") as fp:
+        write_matrix(fp, "Aclass", chars(["Atrajectory", "1.1", "",
+                                          "binNormal"]),
+                     prec=5, text=True, order=order)
+        write_matrix(fp, "name", chars(names), prec=5, text=True, order=order)
+        write_matrix(fp, "description", chars(descs), prec=5, text=True,
+                     order=order)
+        write_matrix(fp, "dataInfo", info, prec=2, order=order)
+        write_matrix(fp, "data_1", [[0.0, 5.0], [1.0, 5.0]], order=order)
+        write_matrix(fp, "data_2", [[0.0, 1.0, -1.0], [0.5, 2.0, -0.5],
+                                    [1.0, 4.0, 0.0]], prec=1, order=order)
+
+def check_dymat(dfile):
+    # Check that a DsresReader reads the same thing as DyMat
+    from DyMat import DyMatFile
+
+    expected = DyMatFile(dfile)
+    with DsresReader(dfile) as mf:
+        assert_equals(mf.blocks(), expected.blocks())
+        assert_equals(mf._vars, expected._vars)
+        for block in mf.blocks():
+            assert_equals(mf.names(block), expected.names(block))
+            assert_equals(mf.size(block), expected.size(block))
+            (abscissa, aname, adesc) = mf.abscissa(block)
+            assert_equals(abscissa.tolist(),
+                          expected.abscissa(block, valuesOnly=True).tolist())
+            assert_equals((aname, adesc), expected.abscissa(block)[1:])
+            for name in mf.names(block):
+                data = mf.data(name)
+                assert_equals(data.dtype, expected.data(name).dtype)
+                assert_equals(data.tolist(), expected.data(name).tolist())
+
+def testDyMat():
+    check_dymat("tests/dsres.mat")
+    check_dymat("tests/fullRobot.mat")
+
+def testNormal():
+    dfile = os.path.join("test_output","normal.mat")
+    for order in ['<', '>']:
+        write_normal(dfile, order=order)
+        check_dymat(dfile)
+        with DsresReader(dfile) as mf:
+            assert_equals(mf.blocks(), [2, 1])
+            assert_equals(mf.abscissa(2, valuesOnly=True).tolist(),
+                          [0.0, 0.5, 1.0])
+            assert_equals(mf.abscissa("x")[1:], ("time", "Time [s]"))
+            assert_equals(mf.data("nx").tolist(), [-1.0, -2.0, -4.0])
+            assert_equals(mf.data("p").tolist(), [5.0, 5.0])
+            assert_equals(mf.description("x"), "State")
+            assert_equals(mf.block("p"), 1)
+
+def testPlotted():
+    dfile = os.path.join("test_output","plotted.mat")
+    with open(dfile, "wb") as fp:
+        write_matrix(fp, "Aclass", chars(["Atrajectory", "1.0"]), prec=5,
+                     text=True)
+        write_matrix(fp, "names", chars(["time", "x"]), prec=5, text=True)
+        write_matrix(fp, "data", [[0.0, 1.0], [1.0, 3.0]])
+    check_dymat(dfile)
+    with DsresReader(dfile) as mf:
+        assert_equals(mf.names(), ["x"])
+        assert_equals(mf.data("x").tolist(), [1.0, 3.0])
+
+def testInvalid():
+    assert_raises(IOError, DsresReader, "tests/fullRobot.mld")
+
+    dfile = os.path.join("test_output","truncated.mat")
+    with open("tests/dsres.mat", "rb") as fp:
+        contents = fp.read()
+    with open(dfile, "wb") as fp:
+        fp.write(contents[:-4])
+    assert_raises(IOError, DsresReader, dfile)
+
+    with open(dfile, "wb") as fp:
+        write_matrix(fp, "data", [[0.0, 1.0]])
+    assert_raises(IOError, DsresReader, dfile)
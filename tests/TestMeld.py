@@ -1,6 +1,6 @@
 from nose.tools import *
 from recon.meld import FinalizedMeld, MissingData, WriteAfterClose
-from recon.meld import MeldWriter, MeldReader
+from recon.meld import MeldWriter, MeldReader, MeldAppender
 
 import os
 
@@ -475,3 +475,884 @@ def testChecking3():
         meld.finalize()
         t.write("time", ["this", "is", "a", "test"]);
         meld.close()
+
+def testAsArray():
+    import numpy
+
+    for single in [False, True]:
+        mfile = os.path.join("test_output","sample_arr.mld")
+        with MeldWriter(mfile, single=single) as meld:
+            t = meld.add_table(name="T1")
+            t.add_signal("time")
+            t.add_signal("x")
+            t.add_signal("y")
+            t.add_signal("s")
+            t.add_alias(alias="a", of="x", transform="aff(2.0,1.0)")
+            t.add_alias(alias="b", of="y", transform="inv")
+            meld.finalize()
+            t.write("time", map(float, range(0,100)))
+            t.write("x", [0.5]*100)
+            t.write("y", [True, False]*50)
+            t.write("s", ["abc"]*100)
+
+        with MeldReader(mfile) as meld:
+            t = meld.read_table("T1")
+            for signal in t.signals():
+                x = t.data(signal, as_array=True)
+                assert_equals(type(x), numpy.ndarray)
+                assert_equals(x.tolist(), t.data(signal))
+            assert_equals(t.data("time", as_array=True).dtype, numpy.float64)
+
+def testPackFloatArray():
+    import numpy
+    import msgpack
+    from recon.serial import pack_float_array, unpack_array
+
+    for n in [1, 15, 16, 2**16-1, 2**16]:
+        x = numpy.linspace(0.0, 1.0, n)
+        for single in [False, True]:
+            data = pack_float_array(x, single=single)
+            assert_equals(data, msgpack.packb(x.tolist(),
+                                              use_single_float=single))
+            assert_equals(unpack_array(data).tolist(),
+                          msgpack.unpackb(data))
+    assert_equals(pack_float_array(numpy.arange(4)), None)
+
+    mfile = os.path.join("test_output","sample_farr.mld")
+    with MeldWriter(mfile, single=False) as meld:
+        t = meld.add_table(name="T1")
+        t.add_signal("time")
+        meld.finalize()
+        t.write("time", numpy.linspace(0.0, 99.0, 100))
+    with MeldReader(mfile) as meld:
+        t = meld.read_table("T1")
+        assert_equals(t.data("time"), map(float, range(0,100)))
+
+def testTypedVectors():
+    import numpy
+
+    for compression in [False, True]:
+        mfile = os.path.join("test_output","sample_typed.mld")
+        with MeldWriter(mfile, typed=True, compression=compression) as meld:
+            t = meld.add_table(name="T1")
+            t.add_signal("time", vtype=float)
+            t.add_signal("i", vtype=int)
+            t.add_signal("b", vtype=bool)
+            t.add_signal("s")
+            t.add_signal("m")
+            t.add_signal("big")
+            t.add_alias(alias="a", of="time", transform="aff(2.0,1.0)")
+            t.add_alias(alias="nb", of="b", transform="inv")
+            meld.finalize()
+            t.write("time", [0.0, 0.5, 1.0, 1.5])
+            t.write("i", [1, -2, 3, 2**40])
+            t.write("b", [True, False, False, True])
+            t.write("s", ["a", "b", "c", "d"])
+            t.write("m", [1, 2.0, "3", True])
+            t.write("big", [1, 2, 3, 2**63])
+
+        with MeldReader(mfile) as meld:
+            assert_equals(meld.typed, True)
+            t = meld.read_table("T1")
+            assert_equals(t.data("time"), [0.0, 0.5, 1.0, 1.5])
+            assert_equals(t.data("i"), [1, -2, 3, 2**40])
+            assert_equals(t.data("b"), [True, False, False, True])
+            assert_equals(t.data("s"), ["a", "b", "c", "d"])
+            assert_equals(t.data("m"), [1, 2.0, "3", True])
+            assert_equals(t.data("big"), [1, 2, 3, 2**63])
+            assert_equals(t.data("a"), [1.0, 2.0, 3.0, 4.0])
+            assert_equals(t.data("nb"), [False, True, True, False])
+            assert_equals(t.data("time", as_array=True).dtype, numpy.float32)
+            assert_equals(t.data("i", as_array=True).dtype, numpy.int64)
+            assert_equals(t.data("nb", as_array=True).tolist(),
+                          [False, True, True, False])
+
+def testUntypedHeader():
+    write_meld(name="sample_ucmeld3",compression=False)
+    with MeldReader(os.path.join("test_output","sample_ucmeld3.mld")) as meld:
+        assert_equals(meld.typed, False)
+
+def testMemoryMapped():
+    import numpy
+
+    for (typed, compression) in [(False, False), (True, False), (True, True)]:
+        mfile = os.path.join("test_output","sample_mmap.mld")
+        with MeldWriter(mfile, typed=typed, compression=compression) as meld:
+            t = meld.add_table(name="T1")
+            t.add_signal("time")
+            t.add_signal("s")
+            t.add_alias(alias="a", of="time", transform="aff(2.0,1.0)")
+            obj = meld.add_object("obj1")
+            meld.finalize()
+            t.write("time", [0.0, 0.5, 1.0, 1.5])
+            t.write("s", ["a", "b", "c", "d"])
+            obj.write(name="Mike")
+
+        with MeldReader(mfile, mmap=True) as meld:
+            t = meld.read_table("T1")
+            assert_equals(t.data("time"), [0.0, 0.5, 1.0, 1.5])
+            assert_equals(t.data("s"), ["a", "b", "c", "d"])
+            assert_equals(t.data("a"), [1.0, 2.0, 3.0, 4.0])
+            assert_equals(meld.read_object("obj1").data, {"name": "Mike"})
+            x = t.data("time", as_array=True)
+        # Arrays may outlive the reader
+        assert_equals(x.tolist(), [0.0, 0.5, 1.0, 1.5])
+
+def testReadMany():
+    write_meld(name="sample_many",compression=False,n=10)
+    with MeldReader(os.path.join("test_output","sample_many.mld")) as meld:
+        t = meld.read_table("T1")
+        for gap in [0, 1024]:
+            many = t.read_many(t.signals(), gap=gap)
+            assert_equals(sorted(many.keys()), sorted(t.signals()))
+            for signal in t.signals():
+                assert_equals(many[signal], t.data(signal))
+        many = t.read_many(["x", "a", "x"], as_array=True)
+        assert_equals(many["a"].tolist(), t.data("a"))
+
+        # Reads are limited to max_run bytes (unless a vector is longer)
+        locs = set(map(lambda x: (t.indices[x]["i"], t.indices[x]["l"]),
+                       t.signals()))
+        longest = max(map(lambda x: x[1], locs))
+        for max_run in [0, 2*longest]:
+            meld.clear_cache()
+            reads = []
+            raw = meld._raw
+            meld._raw = lambda ind, blen: reads.append(blen) or raw(ind, blen)
+            many = t.read_many(t.signals(), gap=1024, max_run=max_run)
+            meld._raw = raw
+            for signal in t.signals():
+                assert_equals(many[signal], t.data(signal))
+            if max_run==0:
+                assert_equals(sorted(reads), sorted(map(lambda x: x[1], locs)))
+            else:
+                assert max(reads)<=max_run
+                assert len(reads)<len(locs)
+
+@raises(NameError)
+def testReadManyMissing():
+    write_meld(name="sample_many",compression=False,n=10)
+    with MeldReader(os.path.join("test_output","sample_many.mld")) as meld:
+        meld.read_table("T1").read_many(["x", "z"])
+
+def testCache():
+    for typed in [False, True]:
+        mfile = os.path.join("test_output","sample_cache.mld")
+        with MeldWriter(mfile, typed=typed) as meld:
+            t = meld.add_table(name="T1")
+            t.add_signal("time")
+            t.add_signal("x")
+            t.add_signal("y")
+            t.add_signal("s")
+            t.add_alias(alias="a", of="x", transform="aff(1.0,1.0)")
+            t.add_alias(alias="b", of="y", transform="inv")
+            t.add_alias(alias="c", of="s")
+            meld.finalize()
+            t.write("time", [0.0, 1.0, 2.0])
+            t.write("x", [1.0, 0.0, 1.0])
+            t.write("y", [2.0, 3.0, 3.0])
+            t.write("s", ["a", "b", "c"])
+
+        with MeldReader(mfile) as meld:
+            t = meld.read_table("T1")
+            x = t.data("x")
+            assert_equals(len(meld.cache), 1)
+            # Aliases of x come from the cache
+            a = t.data("a")
+            assert_equals(len(meld.cache), 1)
+            assert_equals(a, map(lambda v: v+1.0, x))
+            # Modifying returned data doesn't affect the cache
+            x[0] = 100.0
+            assert_equals(t.data("x")[0], 1.0)
+            x = t.data("x", as_array=True)
+            assert x.flags.writeable
+            x[0] = 100.0
+            assert_equals(t.data("a", as_array=True).tolist(), [2.0, 1.0, 2.0])
+            # Only data shared with aliases is cached
+            t.data("time")
+            assert_equals(len(meld.cache), 1)
+            t.data("y")
+            t.data("s")
+            assert_equals(len(meld.cache), 3)
+            assert_equals(t.data("c"), ["a", "b", "c"])
+            assert_equals(t.read_many(t.signals()),
+                          dict(map(lambda s: (s, t.data(s)), t.signals())))
+            meld.clear_cache()
+            assert_equals(len(meld.cache), 0)
+            # The size of the cache is in bytes
+            meld.set_cache_size(1)
+            t.data("x")
+            assert_equals(len(meld.cache), 0)
+            meld.set_cache_size(0)
+            assert_equals(t.data("a"), [2.0, 1.0, 2.0])
+            assert_equals(len(meld.cache), 0)
+
+def testWorkers():
+    mfile = os.path.join("test_output","sample_workers.mld")
+    with MeldWriter(mfile, compression=True, workers=3) as meld:
+        t = meld.add_table(name="T1")
+        for i in range(0,20):
+            t.add_signal("x%d" % (i,))
+        t.add_alias(alias="a", of="x3", transform="inv")
+        obj = meld.add_object("obj")
+        meld.finalize()
+        for i in range(0,20):
+            t.write("x%d" % (i,), [float(i)]*(100*i))
+            if i==10:
+                obj.write(name="Mike")
+
+    with MeldReader(mfile) as meld:
+        t = meld.read_table("T1")
+        for i in range(0,20):
+            assert_equals(t.data("x%d" % (i,)), [float(i)]*(100*i))
+        assert_equals(t.data("a"), [-3.0]*300)
+        assert_equals(meld.read_object("obj").data, {"name": "Mike"})
+        # Vectors are written in the order they were given
+        locs = map(lambda i: t.indices["x%d" % (i,)]["i"], range(0,20))
+        assert_equals(locs, sorted(locs))
+
+def testNoWorkers():
+    mfile = os.path.join("test_output","sample_workers0.mld")
+    for workers in [0, -1]:
+        with MeldWriter(mfile, workers=workers) as meld:
+            assert_equals(meld.pool, None)
+            t = meld.add_table(name="T1")
+            t.add_signal("time")
+            meld.finalize()
+            t.write("time", [0.0, 1.0, 2.0])
+        with MeldReader(mfile) as meld:
+            assert_equals(meld.read_table("T1").data("time"), [0.0, 1.0, 2.0])
+
+def testWorkersError():
+    with open(os.path.join("test_output","sample_workers3.mld"), "wb+") as fp:
+        meld = MeldWriter(fp, workers=2)
+        t = meld.add_table(name="T1")
+        t.add_signal("x")
+        t.add_signal("y")
+        meld.finalize()
+        t.write("x", [object()])
+        t.write("y", [1.0])
+        pool = meld.pool
+        assert_raises(TypeError, meld.close)
+        # The worker threads are stopped anyway
+        assert_equals(meld.pool, None)
+        assert_equals(any(map(lambda x: x.is_alive(), pool._pool)), False)
+
+@raises(WriteAfterClose)
+def testWorkersWriteTwice():
+    with open(os.path.join("test_output","sample_workers2.mld"), "wb+") as fp:
+        meld = MeldWriter(fp, workers=2)
+        t = meld.add_table(name="T1")
+        t.add_signal("time")
+        meld.finalize()
+        t.write("time", [2.0, 1.0, 0.0])
+        t.write("time", [2.0, 1.0, 0.0])
+
+def testCodecs():
+    from recon.serial import CODECS
+
+    for codec in CODECS.keys():
+        name = "sample_codec_"+codec
+        write_meld(name=name,compression=codec,n=100)
+        read_meld(name=name,verbose=False)
+
+    mfile = os.path.join("test_output","sample_codecs.mld")
+    with MeldWriter(mfile, compression="zlib", level=1, typed=True) as meld:
+        t = meld.add_table(name="T1")
+        t.add_signal("time")
+        t.add_signal("x", compression="bz2")
+        t.add_signal("y", compression=False)
+        t.add_alias(alias="a", of="x", transform="inv")
+        obj = meld.add_object("obj")
+        meld.finalize()
+        t.write("time", [0.0, 1.0, 2.0])
+        t.write("x", [1.0, 0.0, 1.0])
+        t.write("y", ["a", "b", "c"])
+        obj.write(name="Mike")
+
+    for mmap in [False, True]:
+        with MeldReader(mfile, mmap=mmap) as meld:
+            assert_equals(meld.compression, "zlib")
+            t = meld.read_table("T1")
+            assert_equals(t.data("time"), [0.0, 1.0, 2.0])
+            assert_equals(t.data("x"), [1.0, 0.0, 1.0])
+            assert_equals(t.data("y"), ["a", "b", "c"])
+            assert_equals(t.data("a", as_array=True).tolist(),
+                          [-1.0, 0.0, -1.0])
+            assert_equals(t.read_many(["a", "y"]),
+                          {"a": [-1.0, 0.0, -1.0], "y": ["a", "b", "c"]})
+            assert_equals(meld.read_object("obj").data, {"name": "Mike"})
+
+def testLevelZero():
+    import zlib
+    from recon.serial import compress
+
+    # Level 0 means "store" for zlib (not the default level)
+    data = "a"*1000
+    assert_equals(compress(data, "zlib", 0), zlib.compress(data, 0))
+    assert len(compress(data, "zlib", 0))>len(data)
+    assert_equals(compress(data, "zlib"), zlib.compress(data, 6))
+    assert_raises(ValueError, compress, data, "bz2", 0)
+
+    mfile = os.path.join("test_output","sample_level.mld")
+    with MeldWriter(mfile, compression="zlib", level=0) as meld:
+        t = meld.add_table(name="T1")
+        t.add_signal("x")
+        meld.finalize()
+        t.write("x", [1.0]*1000)
+    with MeldReader(mfile) as meld:
+        t = meld.read_table("T1")
+        assert t.indices["x"]["l"]>1000
+        assert_equals(t.data("x"), [1.0]*1000)
+
+def testMeldID():
+    mfile = os.path.join("test_output","sample_id.mld")
+    for (opts, sopts, fid) in [({}, {}, "recon:meld:v01"),
+                               ({"compression": True}, {}, "recon:meld:v01"),
+                               ({"compression": "zlib"}, {}, "recon:meld:v02"),
+                               ({"typed": True}, {}, "recon:meld:v02"),
+                               ({"split_header": True}, {}, "recon:meld:v02"),
+                               ({}, {"chunk_size": 2}, "recon:meld:v02"),
+                               ({}, {"compression": "bz2"}, "recon:meld:v02")]:
+        with MeldWriter(mfile, **opts) as meld:
+            t = meld.add_table(name="T1")
+            t.add_signal("time")
+            t.add_signal("x", **sopts)
+            meld.finalize()
+            t.write("time", [0.0, 1.0, 2.0])
+            t.write("x", [1.0, 0.0, 1.0])
+        with open(mfile, "rb") as fp:
+            assert_equals(fp.read(14), fid)
+        with MeldReader(mfile) as meld:
+            assert_equals(meld.read_table("T1").data("x"), [1.0, 0.0, 1.0])
+
+def testBz2Header():
+    write_meld(name="sample_cmeld3",compression=True)
+    with MeldReader(os.path.join("test_output","sample_cmeld3.mld")) as meld:
+        assert_equals(meld.compression, True)
+
+@raises(ValueError)
+def testUnknownCodec():
+    MeldWriter(os.path.join("test_output","sample_codec.mld"),
+               compression="foo")
+
+@raises(ValueError)
+def testUnknownSignalCodec():
+    meld = MeldWriter(os.path.join("test_output","sample_codec.mld"))
+    t = meld.add_table(name="T1")
+    t.add_signal("time", compression="foo")
+
+def testFilters():
+    import numpy
+
+    mfile = os.path.join("test_output","sample_filters.mld")
+    for compression in [False, True, "zlib"]:
+        with MeldWriter(mfile, typed=True, compression=compression) as meld:
+            t = meld.add_table(name="T1")
+            t.add_signal("time", filters=["delta", "shuffle"])
+            t.add_signal("x", filters=["shuffle"])
+            t.add_signal("i", vtype=int, filters=["delta"])
+            t.add_signal("b", vtype=bool, filters=["shuffle"])
+            t.add_signal("s", filters=["shuffle"])
+            t.add_signal("e", filters=["delta", "shuffle"])
+            t.add_alias(alias="a", of="time", transform="aff(2.0,1.0)")
+            meld.finalize()
+            t.write("time", [0.0, 0.5, 1.0, 1.5])
+            t.write("x", [3.0, -1.0, 0.25, 1e10])
+            t.write("i", [5, -2, 3, 2**40])
+            t.write("b", [True, False, False, True])
+            t.write("s", ["a", "b", "c", "d"])
+            t.write("e", [])
+
+        for mmap in [False, True]:
+            with MeldReader(mfile, mmap=mmap) as meld:
+                t = meld.read_table("T1")
+                assert_equals(t.data("time"), [0.0, 0.5, 1.0, 1.5])
+                assert_equals(t.data("x"), [3.0, -1.0, 0.25, 1e10])
+                assert_equals(t.data("i"), [5, -2, 3, 2**40])
+                assert_equals(t.data("b"), [True, False, False, True])
+                assert_equals(t.data("s"), ["a", "b", "c", "d"])
+                assert_equals(t.data("e"), [])
+                assert_equals(t.data("a"), [1.0, 2.0, 3.0, 4.0])
+                x = t.data("x", as_array=True)
+                assert_equals(x.dtype, numpy.float32)
+                assert_equals(x.tolist(), [3.0, -1.0, 0.25, 1e10])
+                assert_equals(t.read_many(["a", "i"]),
+                              {"a": [1.0, 2.0, 3.0, 4.0],
+                               "i": [5, -2, 3, 2**40]})
+
+def testWriteArrays():
+    import numpy
+
+    mfile = os.path.join("test_output","sample_arrays.mld")
+    time = numpy.arange(0.0, 10.0, 0.5)
+    for (typed, chunk_size) in [(True, None), (False, None), (True, 8)]:
+        with MeldWriter(mfile, typed=typed, chunk_size=chunk_size,
+                        summaries=4) as meld:
+            t = meld.add_table(name="T1")
+            t.add_signal("time", vtype=float, filters=["delta"] if typed else None)
+            t.add_signal("i", vtype=int)
+            t.add_signal("u")
+            t.add_signal("b", vtype=bool)
+            t.add_signal("s", vtype=str)
+            t.add_signal("l")
+            t.add_alias(alias="nt", of="time", transform="inv")
+            meld.finalize()
+            assert_raises(TypeError, t.write, "i", time)
+            assert_raises(TypeError, t.write, "b", time.astype(int))
+            assert_raises(ValueError, t.write, "u", numpy.zeros((2,2)))
+            t.write("time", time.astype(numpy.float32))
+            t.write("i", numpy.arange(-10, 10, dtype=numpy.int16))
+            t.write("u", numpy.array([2**63, 1], dtype=numpy.uint64))
+            t.write("b", time>5.0)
+            t.write("s", numpy.array(["a", "bc"]))
+            t.write("l", [1, 2])
+
+        with MeldReader(mfile) as meld:
+            t = meld.read_table("T1")
+            assert_equals(t.data("time"), time.tolist())
+            assert_equals(t.data("nt"), (-time).tolist())
+            assert_equals(t.data("i"), range(-10, 10))
+            assert_equals(t.data("u"), [2**63, 1])
+            assert_equals(t.data("b"), (time>5.0).tolist())
+            assert_equals(t.data("s"), ["a", "bc"])
+            assert_equals(t.data("l"), [1, 2])
+            assert_equals(t.data_decimated("time", 2),
+                          ([0.0, 8.0], [7.5, 9.5], [3.75, 8.75]))
+
+@raises(ValueError)
+def testFiltersUntyped():
+    meld = MeldWriter(os.path.join("test_output","sample_filters.mld"))
+    t = meld.add_table(name="T1")
+    t.add_signal("time", filters=["shuffle"])
+
+@raises(ValueError)
+def testUnknownFilter():
+    meld = MeldWriter(os.path.join("test_output","sample_filters.mld"),
+                      typed=True)
+    t = meld.add_table(name="T1")
+    t.add_signal("time", filters=["foo"])
+
+def testChunked():
+    import numpy
+
+    mfile = os.path.join("test_output","sample_chunked.mld")
+    time = map(lambda x: x*0.5, range(25))
+    for (typed, compression, workers) in [(False, False, None),
+                                          (True, "zlib", None),
+                                          (True, True, 2)]:
+        with MeldWriter(mfile, typed=typed, compression=compression,
+                        workers=workers, chunk_size=10) as meld:
+            t = meld.add_table(name="T1")
+            t.add_signal("time")
+            t.add_signal("x", chunk_size=4)
+            t.add_signal("y", chunk_size=0)
+            t.add_signal("e")
+            t.add_alias(alias="a", of="time", transform="aff(2.0,1.0)")
+            meld.finalize()
+            t.write("time", time)
+            t.write("x", range(25))
+            t.write("y", range(25))
+            t.write("e", [])
+
+        for mmap in [False, True]:
+            with MeldReader(mfile, mmap=mmap) as meld:
+                t = meld.read_table("T1")
+                assert_equals(t.indices["time"]["k"], 10)
+                assert_equals(t.indices["x"]["k"], 4)
+                assert_equals("k" in t.indices["y"], False)
+                assert_equals(t.data("time"), time)
+                assert_equals(t.data("x"), range(25))
+                assert_equals(t.data("e"), [])
+                assert_equals(t.data("e", as_array=True).tolist(), [])
+                assert_equals(t.data("a"), map(lambda x: 2*x+1, time))
+                for (start, stop) in [(3, 7), (8, 22), (None, 5), (20, None),
+                                      (-3, None), (10, 10), (7, 3), (0, 100)]:
+                    meld.clear_cache()
+                    assert_equals(t.data("x", start=start, stop=stop),
+                                  range(25)[start:stop])
+                    assert_equals(t.data("y", start=start, stop=stop),
+                                  range(25)[start:stop])
+                    x = t.data("x", as_array=True, start=start, stop=stop)
+                    assert_equals(x.tolist(), range(25)[start:stop])
+                    a = t.data("a", as_array=True, start=start, stop=stop)
+                    assert_equals(a.tolist(),
+                                  map(lambda x: 2*x+1, time[start:stop]))
+                assert_equals(t.read_many(["a", "x", "y"]),
+                              {"a": map(lambda x: 2*x+1, time),
+                               "x": range(25), "y": range(25)})
+
+    # Only the chunks holding the requested values are read
+    with MeldReader(mfile) as meld:
+        t = meld.read_table("T1")
+        reads = []
+        raw = meld._raw
+        meld._raw = lambda ind, blen: reads.append(blen) or raw(ind, blen)
+        t.data("x", start=9, stop=13)
+        chunks = meld.chunks.values()[0]["c"]
+        assert_equals(reads[1], chunks[2][1]+chunks[3][1])
+
+@raises(ValueError)
+def testNegativeChunkSize():
+    meld = MeldWriter(os.path.join("test_output","sample_chunked.mld"))
+    t = meld.add_table(name="T1")
+    t.add_signal("time", chunk_size=-1)
+
+def testStream():
+    import numpy
+
+    x = map(lambda i: float((i*7)%23), range(100))
+    pieces = [x[:3], numpy.array(x[3:40]), [], x[40:41], x[41:]]
+    files = []
+    for (stream, workers) in [(False, None), (True, None), (True, 2)]:
+        mfile = os.path.join("test_output","sample_stream%d.mld" % (len(files),))
+        files.append(mfile)
+        with MeldWriter(mfile, typed=True, workers=workers, chunk_size=8,
+                        summaries=4) as meld:
+            t = meld.add_table(name="T1")
+            t.add_signal("x")
+            t.add_signal("y", chunk_size=0)
+            t.add_signal("s")
+            t.add_signal("e")
+            t.add_alias(alias="a", of="x", transform="inv")
+            meld.finalize()
+            if stream:
+                t.stream("x", iter(pieces))
+                t.stream("y", iter(pieces))
+                t.stream("s", iter([["a"]*5, ["b"]*6]))
+                t.stream("e", iter([]))
+                assert_raises(WriteAfterClose, t.stream, "x", [])
+            else:
+                t.write("x", x)
+                t.write("y", x)
+                t.write("s", ["a"]*5+["b"]*6)
+                t.write("e", [])
+
+    with MeldReader(files[0]) as expected:
+        e = expected.read_table("T1")
+        for mfile in files[1:]:
+            with MeldReader(mfile) as meld:
+                t = meld.read_table("T1")
+                for name in ["x", "y", "s", "e", "a"]:
+                    assert_equals(t.data(name), e.data(name))
+                    assert_equals("m" in t.indices[name], "m" in e.indices[name])
+                assert_equals(len(t._chunk_index(t.indices["x"])["c"]), 13)
+                assert_equals(t.data_decimated("a", 10),
+                              e.data_decimated("a", 10))
+
+@raises(TypeError)
+def testStreamTypeMismatch():
+    meld = MeldWriter(os.path.join("test_output","sample_stream.mld"),
+                      chunk_size=4)
+    t = meld.add_table(name="T1")
+    t.add_signal("x", vtype=int)
+    meld.finalize()
+    t.stream("x", iter([[1, 2, 3], [4, 5.0]]))
+
+def testWindow():
+    mfile = os.path.join("test_output","sample_window.mld")
+    time = [0.0, 0.5, 1.0, 1.0, 1.5, 2.0, 2.5, 3.0, 3.5, 4.0, 4.5]
+    for chunk_size in [None, 1, 3, 100]:
+        with MeldWriter(mfile, typed=True, chunk_size=chunk_size) as meld:
+            t = meld.add_table(name="T1")
+            t.add_signal("Time")
+            t.add_signal("x")
+            t.add_alias(alias="a", of="x", transform="aff(2.0,1.0)")
+            meld.finalize()
+            t.write("Time", time)
+            t.write("x", range(len(time)))
+
+        with MeldReader(mfile) as meld:
+            t = meld.read_table("T1")
+            for (t0, t1) in [(1.0, 2.0), (0.7, 2.2), (-1.0, 0.0),
+                             (4.5, 10.0), (-2.0, -1.0), (5.0, 6.0),
+                             (3.0, 2.0), (-10.0, 10.0)]:
+                rows = filter(lambda i: time[i]>=t0 and time[i]<=t1,
+                              range(len(time)))
+                w = t.window(["Time", "x", "a"], t0, t1)
+                assert_equals(w["Time"], map(lambda i: time[i], rows))
+                assert_equals(w["x"], rows)
+                assert_equals(w["a"], map(lambda i: 2*i+1, rows))
+                w = t.window(["x"], t0, t1, as_array=True)
+                assert_equals(w["x"].tolist(), rows)
+
+            # An unchunked abscissa is only read once
+            if chunk_size==None:
+                reads = []
+                raw = meld._raw
+                meld._raw = lambda ind, blen: \
+                    reads.append(ind) or raw(ind, blen)
+                t.window(["x"], 1.0, 2.0)
+                assert_equals(sorted(reads),
+                              sorted([t.indices["Time"]["i"],
+                                      t.indices["x"]["i"]]))
+
+@raises(NameError)
+def testWindowMissingAbscissa():
+    write_meld(name="sample_ucmeld4",compression=False)
+    with MeldReader(os.path.join("test_output","sample_ucmeld4.mld")) as meld:
+        t = meld.read_table("T1")
+        t.window(["time"], 0.0, 1.0, abscissa="t")
+
+def testSummaries():
+    from recon.util import summarize
+
+    mfile = os.path.join("test_output","sample_summaries.mld")
+    x = map(lambda i: float((i*7)%23), range(2000))
+    for (summaries, compression) in [(4, False), (8, "zlib")]:
+        with MeldWriter(mfile, typed=True, compression=compression,
+                        summaries=summaries) as meld:
+            t = meld.add_table(name="T1")
+            t.add_signal("x")
+            t.add_signal("s")
+            t.add_signal("b")
+            t.add_alias(alias="a", of="x", transform="aff(-2.0,1.0)")
+            meld.finalize()
+            t.write("x", x)
+            t.write("s", ["a"]*10)
+            t.write("b", [True, False])
+
+        with MeldReader(mfile) as meld:
+            t = meld.read_table("T1")
+            assert_equals("m" in t.indices["x"], True)
+            assert_equals("m" in t.indices["a"], True)
+            assert_equals("m" in t.indices["s"], False)
+
+            # Envelopes from the summaries don't read the data
+            reads = []
+            raw = meld._raw
+            meld._raw = lambda ind, blen: reads.append(ind) or raw(ind, blen)
+            (mins, maxs, means) = t.data_decimated("x", 100)
+            assert_equals(reads, [t.indices["x"]["m"][0]])
+            assert len(mins)<=100
+            assert len(mins)>=100/4
+            size = summaries
+            while (len(x)+size-1)//size>len(mins):
+                size = size*4
+            assert_equals((mins, maxs), summarize(x, size)[:2])
+            for (m, e) in zip(means, summarize(x, size)[2]):
+                assert_almost_equals(m, e, places=4)
+
+            (amins, amaxs, ameans) = t.data_decimated("a", 100)
+            assert_equals(amins, map(lambda v: -2*v+1, maxs))
+            assert_equals(amaxs, map(lambda v: -2*v+1, mins))
+            meld._raw = raw
+
+            # Coarsest level
+            assert_equals(t.data_decimated("x", 1)[:2], ([0.0], [22.0]))
+
+            # Fall back to the data itself
+            assert_equals(t.data_decimated("x", 5000), (x, x, x))
+            assert_equals("m" in t.indices["b"], False)
+
+    write_meld(name="sample_ucmeld5",compression=False,n=10)
+    with MeldReader(os.path.join("test_output","sample_ucmeld5.mld")) as meld:
+        t = meld.read_table("T1")
+        assert_equals(t.data_decimated("b", 7),
+                      ([-3.0, -3.0, 0.0, 0.0, 0.0, 0.0, 0.0],
+                       [-2.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0],
+                       [-2.5, -1.5, 0.0, 0.0, 0.0, 0.0, 0.0]))
+
+def testSummariesPrecision():
+    import numpy
+
+    mfile = os.path.join("test_output","sample_summaries.mld")
+    x = map(lambda i: 0.1*((i*7)%23), range(100))
+    n = map(lambda i: 2**40+i, range(100))
+    for typed in [False, True]:
+        with MeldWriter(mfile, typed=typed, summaries=8) as meld:
+            t = meld.add_table(name="T1")
+            t.add_signal("x")
+            t.add_signal("y")
+            t.add_signal("n")
+            meld.finalize()
+            t.write("x", x)
+            t.write("y", numpy.array(x))
+            t.write("n", n)
+
+        with MeldReader(mfile) as meld:
+            t = meld.read_table("T1")
+            for name in ["x", "y"]:
+                (mins, maxs, means) = t.data_decimated(name, 1)
+                assert_equals((mins, maxs), ([min(x)], [max(x)]))
+                assert_almost_equals(means[0], sum(x)/len(x), places=12)
+            assert_equals(t.data_decimated("n", 1)[:2], ([2**40], [2**40+99]))
+
+@raises(TypeError)
+def testSummariesNotNumeric():
+    mfile = os.path.join("test_output","sample_summaries.mld")
+    with MeldWriter(mfile, summaries=True) as meld:
+        t = meld.add_table(name="T1")
+        t.add_signal("s")
+        meld.finalize()
+        t.write("s", ["a"]*10)
+    with MeldReader(mfile) as meld:
+        meld.read_table("T1").data_decimated("s", 5)
+
+def testAppend():
+    for (compression, typed) in [(False, False), (True, True)]:
+        mfile = os.path.join("test_output","sample_append.mld")
+        with MeldWriter(mfile, compression=compression, typed=typed) as meld:
+            t = meld.add_table(name="T1", metadata={"model": "Foo"})
+            t.add_signal("time")
+            t.add_signal("x", metadata={"units": "m"})
+            obj = meld.add_object("obj1")
+            meld.finalize()
+            t.write("time", [0.0, 1.0, 2.0])
+            t.write("x", [1.0, 0.0, 1.0])
+            obj.write(name="Mike")
+        size = os.path.getsize(mfile)
+
+        # Append to an existing table, a new table and a new object
+        with MeldAppender(mfile) as meld:
+            t = meld.extend_table("T1")
+            t.add_signal("y", metadata={"units": "s"})
+            t.add_alias(alias="a", of="x", transform="aff(2.0,1.0)")
+            t.add_alias(alias="b", of="y", transform="inv")
+            t2 = meld.add_table(name="T2")
+            t2.add_signal("z")
+            obj = meld.add_object("obj2", metadata={"a": "b"})
+            meld.finalize()
+            t.write("y", [3.0, 4.0, 5.0])
+            t2.write("z", ["a"])
+            obj.write(name="Pete")
+        assert os.path.getsize(mfile)>size
+
+        # Earlier readers must refuse melds with a relocated header
+        with open(mfile, "rb") as fp:
+            assert_equals(fp.read(14), "recon:meld:v02")
+
+        # ...and then do it again
+        with MeldAppender(mfile, chunk_size=2) as meld:
+            t = meld.extend_table("T1")
+            t.add_signal("w")
+            meld.finalize()
+            t.write("w", [6.0, 7.0, 8.0])
+
+        for mmap in [False, True]:
+            with MeldReader(mfile, mmap=mmap) as meld:
+                assert_equals(meld.compression, compression)
+                assert_equals(sorted(meld.tables()), ["T1", "T2"])
+                assert_equals(sorted(meld.objects()), ["obj1", "obj2"])
+                t = meld.read_table("T1")
+                assert_equals(t.signals(), ["time", "x", "y", "a", "b", "w"])
+                assert_equals(t.metadata, {"model": "Foo"})
+                assert_equals(t.var_metadata, {"x": {"units": "m"},
+                                               "y": {"units": "s"}})
+                assert_equals(t.data("time"), [0.0, 1.0, 2.0])
+                assert_equals(t.data("x"), [1.0, 0.0, 1.0])
+                assert_equals(t.data("y"), [3.0, 4.0, 5.0])
+                assert_equals(t.data("a"), [3.0, 1.0, 3.0])
+                assert_equals(t.data("b"), [-3.0, -4.0, -5.0])
+                assert_equals(t.data("w", start=1), [7.0, 8.0])
+                assert_equals(meld.read_table("T2").data("z"), ["a"])
+                assert_equals(meld.read_object("obj1").data, {"name": "Mike"})
+                assert_equals(meld.read_object("obj2").data, {"name": "Pete"})
+                assert_equals(meld.read_object("obj2").metadata, {"a": "b"})
+
+def testAppendDuplicates():
+    write_meld(name="sample_append2",compression=False)
+    mfile = os.path.join("test_output","sample_append2.mld")
+    with MeldAppender(mfile) as meld:
+        assert_raises(NameError, meld.add_table, "T1")
+        assert_raises(NameError, meld.add_object, "obj1")
+        assert_raises(NameError, meld.extend_table, "T2")
+        t = meld.extend_table("T1")
+        assert_raises(NameError, t.add_signal, "x")
+        assert_raises(NameError, t.add_alias, "a", "x")
+        assert_raises(NameError, t.add_alias, "c", "a")
+        t.add_alias("c", "time", metadata={"foo": "bar"})
+        meld.finalize()
+        assert_raises(FinalizedMeld, meld.extend_table, "T1")
+    read_meld(name="sample_append2",verbose=False)
+    with MeldReader(mfile) as meld:
+        t = meld.read_table("T1")
+        assert_equals(t.data("c"), [0.0, 1.0, 2.0])
+        assert_equals(t.var_metadata["c"], {"foo": "bar"})
+
+def testAppendIncomplete():
+    mfile = os.path.join("test_output","sample_append3.mld")
+    write_meld(name="sample_append3",compression=False)
+    with open(mfile, "rb") as fp:
+        contents = fp.read()
+
+    # Data that was never written
+    meld = MeldAppender(mfile)
+    t = meld.extend_table("T1")
+    t.add_signal("y2")
+    obj = meld.add_object("obj3")
+    meld.finalize()
+    assert_raises(MissingData, meld.close)
+    meld.fp.close()
+
+    # An exception while appending
+    try:
+        with MeldAppender(mfile) as meld:
+            t = meld.extend_table("T1")
+            t.add_signal("y2")
+            meld.finalize()
+            t.write("y2", [1.0, 2.0, 3.0])
+            raise ValueError()
+    except ValueError:
+        pass
+
+    # The meld is left as it was
+    with open(mfile, "rb") as fp:
+        assert_equals(fp.read(len(contents)), contents)
+    read_meld(name="sample_append3",verbose=False)
+    with MeldReader(mfile) as meld:
+        assert_equals("y2" in meld.read_table("T1").signals(), False)
+        assert_equals(sorted(meld.objects()), ["obj1", "obj2"])
+
+def testSplitHeader():
+    mfile = os.path.join("test_output","sample_split.mld")
+    with MeldWriter(mfile, split_header=True, typed=True,
+                    summaries=2) as meld:
+        for name in ["T1", "T2", "T3"]:
+            t = meld.add_table(name=name, metadata={"name": name})
+            t.add_signal("time", metadata={"units": "s"})
+            t.add_signal("s")
+            t.add_alias(alias="a", of="time", transform="aff(2.0,1.0)")
+        obj = meld.add_object("obj1")
+        meld.finalize()
+        for name in ["T1", "T2", "T3"]:
+            meld.tables[name].write("time", [0.0, 1.0, 2.0])
+            meld.tables[name].write("s", ["a", "b", "c"])
+        obj.write(name="Mike")
+
+    with MeldReader(mfile) as meld:
+        assert_equals(meld.split, True)
+        assert_equals(sorted(meld.tables()), ["T1", "T2", "T3"])
+        # Only the sections of tables that are read are decoded
+        assert_equals(meld.sections, {})
+        t = meld.read_table("T2")
+        assert_equals(meld.sections.keys(), ["T2"])
+        assert_equals(t.metadata, {"name": "T2"})
+        assert_equals(t.var_metadata, {"time": {"units": "s"}})
+        assert_equals(t.signals(), ["time", "s", "a"])
+        assert_equals(t.data("a"), [1.0, 3.0, 5.0])
+        assert_equals(t.data("s"), ["a", "b", "c"])
+        assert_equals(t.data_decimated("a", 2)[0], [1.0, 5.0])
+        assert_equals(meld.read_object("obj1").data, {"name": "Mike"})
+        assert_equals(sorted(meld.report().keys()),
+                      ["T1", "T2", "T3", "header"])
+
+    # Appending to a meld with a split header keeps it split
+    with MeldAppender(mfile) as meld:
+        t = meld.extend_table("T1")
+        t.add_signal("x")
+        t4 = meld.add_table(name="T4")
+        t4.add_signal("y")
+        meld.finalize()
+        t.write("x", [3.0, 4.0, 5.0])
+        t4.write("y", [6.0])
+    with MeldReader(mfile) as meld:
+        assert_equals(meld.split, True)
+        assert_equals(sorted(meld.tables()), ["T1", "T2", "T3", "T4"])
+        t = meld.read_table("T1")
+        assert_equals(meld.sections.keys(), ["T1"])
+        assert_equals(t.signals(), ["time", "s", "a", "x"])
+        assert_equals(t.data("x"), [3.0, 4.0, 5.0])
+        assert_equals(t.data("a"), [1.0, 3.0, 5.0])
+        assert_equals(meld.read_table("T3").data("a"), [1.0, 3.0, 5.0])
+        assert_equals(meld.read_table("T4").data("y"), [6.0])
@@ -74,3 +74,100 @@ def testDsres2Meld_Compression_Robot():
         meld = MeldReader(fp, verbose=False)
         print str(meld.report())
 
+
+def testWall2MeldSpill():
+    # Write a wall with interleaved tables and a small spill size so
+    # that columns are spilled (and reassembled) several times
+    wfile = os.path.join("test_output","sample_spill.wll")
+    mfile = os.path.join("test_output","sample_spill.mld")
+    with WallWriter(wfile, metadata={"a": "bar"}) as wall:
+        t1 = wall.add_table(name="T1")
+        t1.add_signal("time")
+        t1.add_signal("x")
+        t1.add_signal("s")
+        t1.add_alias("nx", of="x", transform="inv")
+        t2 = wall.add_table(name="T2")
+        t2.add_signal("time")
+        t3 = wall.add_table(name="T3")
+        t3.add_signal("empty")
+        obj = wall.add_object("obj", metadata={"b": "foo"})
+        wall.finalize()
+        for i in range(0,25):
+            t1.add_row(float(i), i, str(i))
+            if i%5==0:
+                t2.add_row(float(i))
+                obj.add_fields(count=i)
+            wall.flush()
+        obj.add_fields(name="Mike")
+        wall.flush()
+
+    wall2meld(wfile, mfile, spill_rows=4)
+    check_spill(mfile)
+
+    # The same data, written in blocks of rows
+    with WallWriter(wfile, metadata={"a": "bar"}, batch=True,
+                    blocks=True) as wall:
+        t1 = wall.add_table(name="T1")
+        t1.add_signal("time")
+        t1.add_signal("x")
+        t1.add_signal("s")
+        t1.add_alias("nx", of="x", transform="inv")
+        t2 = wall.add_table(name="T2")
+        t2.add_signal("time")
+        t3 = wall.add_table(name="T3")
+        t3.add_signal("empty")
+        obj = wall.add_object("obj", metadata={"b": "foo"})
+        wall.finalize()
+        t1.add_rows(map(lambda i: [float(i), i, str(i)], range(0,10)))
+        for i in range(10,25):
+            t1.add_row(float(i), i, str(i))
+        t2.add_rows(map(lambda i: [float(i)], range(0,25,5)))
+        obj.add_fields(count=20)
+        obj.add_fields(name="Mike")
+        wall.flush()
+
+    wall2meld(wfile, mfile, spill_rows=4)
+    check_spill(mfile)
+
+    # Columns are streamed into chunks
+    wall2meld(wfile, mfile, spill_rows=4, chunk_size=3, summaries=True)
+    check_spill(mfile)
+    with MeldReader(mfile) as meld:
+        t1 = meld.read_table("T1")
+        assert_equals(len(t1._chunk_index(t1.indices["x"])["c"]), 9)
+        assert_equals(t1.data_decimated("x", 1)[:2], ([0.0], [24.0]))
+
+def check_spill(mfile):
+    # Check the meld written by testWall2MeldSpill
+    with MeldReader(mfile) as meld:
+        assert_equals(meld.metadata, {"a": "bar"})
+        t1 = meld.read_table("T1")
+        assert_equals(t1.data("time"), map(float, range(0,25)))
+        assert_equals(t1.data("x"), range(0,25))
+        assert_equals(t1.data("nx"), map(lambda x: -x, range(0,25)))
+        assert_equals(t1.data("s"), map(str, range(0,25)))
+        assert_equals(meld.read_table("T2").data("time"),
+                      [0.0, 5.0, 10.0, 15.0, 20.0])
+        assert_equals(meld.read_table("T3").data("empty"), [])
+        obj = meld.read_object("obj")
+        assert_equals(obj.data, {"count": 20, "name": "Mike"})
+        assert_equals(obj.metadata, {"b": "foo"})
+
+def testDsres2Meld_Values():
+    import numpy
+    from DyMat import DyMatFile
+
+    mf = DyMatFile("tests/fullRobot.mat")
+    mfile = os.path.join("test_output","dsres_values.mld")
+    for typed in [False, True]:
+        dsres2meld("tests/fullRobot.mat", mfile, compression=False,
+                   typed=typed)
+        with MeldReader(mfile) as meld:
+            for block in mf.blocks():
+                t = meld.read_table("T"+str(block))
+                (abscissa, aname, adesc) = mf.abscissa(block)
+                assert_equals(t.data(aname), abscissa.tolist())
+                data = t.read_many(mf.names(block))
+                for name in mf.names(block):
+                    expected = mf.data(name).astype(numpy.float32)
+                    assert_equals(data[name], expected.tolist())
@@ -0,0 +1,96 @@
+from recon.util import parse_transform, LRUCache, summarize, pyramid
+
+from nose.tools import *
+
+def testInvTransform():
+    inv = parse_transform("inv")
+    assert_equals(inv.apply([1.0, -2.0, 3.0]), [-1.0, 2.0, -3.0])
+    assert_equals(inv.apply([1, -2, 3L]), [-1, 2, -3L])
+    assert_equals(inv.apply([True, False]), [False, True])
+    assert_equals(inv.apply([1.0, True, "x"]), [-1.0, False, "x"])
+    assert_equals(inv.apply([]), [])
+
+def testAffineTransform():
+    aff = parse_transform("aff(2.0, 1.0)")
+    assert_equals(aff.apply([1.0, -2.0, 3.0]), [3.0, -3.0, 7.0])
+    assert_equals(aff.apply([1, 2]), [3.0, 5.0])
+    assert_equals(aff.apply([1.0, True, "x"]), [3.0, True, "x"])
+
+def testArrayTransforms():
+    import numpy
+    inv = parse_transform("inv")
+    aff = parse_transform("aff(2.0,1.0)")
+    assert_equals(inv.apply(numpy.array([1.0, -2.0])).tolist(), [-1.0, 2.0])
+    assert_equals(inv.apply(numpy.array([True, False])).tolist(),
+                  [False, True])
+    assert_equals(aff.apply(numpy.array([1, 2])).tolist(), [3.0, 5.0])
+
+def testParseTransform():
+    assert parse_transform("aff(2.0,1.0)") is parse_transform("aff(2.0,1.0)")
+    assert_equals(parse_transform("aff(2.0)"), None)
+    assert_equals(parse_transform("foo"), None)
+    assert_equals(parse_transform(None), None)
+    assert_equals(parse_transform(1.0), None)
+
+def testLRUCache():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert_equals(cache.get("a"), 1)
+    cache.put("c", 3)
+    assert_equals(cache.get("b"), None)
+    assert_equals(len(cache), 2)
+    cache.resize(1)
+    assert "c" in cache
+    assert not "a" in cache
+    cache.clear()
+    assert_equals(len(cache), 0)
+
+    # Weighted entries
+    cache = LRUCache(5, weigh=len)
+    cache.put("a", "xx")
+    cache.put("b", "yyy")
+    cache.put("c", "zz")
+    assert not "a" in cache
+    assert_equals(cache.weight, 5)
+    cache.put("d", "x"*6)
+    assert not "d" in cache
+    assert_equals(len(cache), 2)
+
+def testSummarize():
+    assert_equals(summarize([1, 5, 2.0, -1, 4], 2),
+                  ([1.0, -1.0, 4.0], [5.0, 2.0, 4.0], [3.0, 0.5, 4.0]))
+    assert_equals(summarize([], 2), ([], [], []))
+    assert_equals(summarize([True, False], 2), None)
+    assert_equals(summarize([1.0, "x"], 2), None)
+
+def testSummarizeArray():
+    import numpy
+
+    data = [1, 5, 2.5, -1, 4]
+    for dtype in [numpy.float32, numpy.float64]:
+        assert_equals(summarize(numpy.array(data, dtype=dtype), 2),
+                      summarize(data, 2))
+    assert_equals(summarize(numpy.array([3, 1, 2], dtype=numpy.uint8), 2),
+                  ([1.0, 2.0], [3.0, 2.0], [2.0, 2.0]))
+    assert_equals(summarize(numpy.array([]), 2), ([], [], []))
+    assert_equals(summarize(numpy.array([True, False]), 2), None)
+    assert_equals(summarize(numpy.array(["a", "b"]), 2), None)
+
+def testSummarizeIntegers():
+    # Minimums and maximums are exact (even for integers that don't fit
+    # in a double or in 64 bits)
+    data = [2**60+1, 2**60+3, 2**60]
+    assert_equals(summarize(data, 2)[:2], ([2**60+1, 2**60], [2**60+3, 2**60]))
+    data = [2**70+1, 2**70+3, 2**70]
+    assert_equals(summarize(data, 2)[:2], ([2**70+1, 2**70], [2**70+3, 2**70]))
+
+def testPyramid():
+    data = range(10)
+    levels = pyramid(data, 2, 2)
+    assert_equals(map(lambda x: x[0], levels), [2, 4, 8, 16])
+    assert_equals(levels[1], (4, [0.0, 4.0, 8.0], [3.0, 7.0, 9.0],
+                              [1.5, 5.5, 8.5]))
+    assert_equals(levels[2], (8, [0.0, 8.0], [7.0, 9.0], [3.5, 8.5]))
+    assert_equals(levels[3], (16, [0.0], [9.0], [4.5]))
+    assert_equals(pyramid(["a"], 2, 2), None)
@@ -315,3 +315,408 @@ def testBadTransform1():
         t.add_alias("a", of="time", transform=1.0)
         wall.finalize()
         t.add_row(time=0.0)
+
+def testInterleaved():
+    with open(os.path.join("test_output","sample_19.wll"), "wb+") as fp:
+        wall = WallWriter(fp)
+        t1 = wall.add_table(name="T1")
+        t1.add_signal("time")
+        t1.add_signal("x")
+        t2 = wall.add_table(name="T2")
+        t2.add_signal("time")
+        t2.add_signal("y")
+        obj = wall.add_object("obj")
+        wall.finalize()
+        for i in range(0,10):
+            t1.add_row(float(i), i)
+            if i%2==0:
+                t2.add_row(float(i), -i)
+            obj.add_fields(last=i)
+            wall.flush()
+
+    with open(os.path.join("test_output","sample_19.wll"), "rb") as fp:
+        wall = WallReader(fp)
+        t1 = wall.read_table("T1")
+        t2 = wall.read_table("T2")
+        assert_equals(t1.data("x"), range(0,10))
+        assert_equals(t2.data("y"), [0, -2, -4, -6, -8])
+        assert_equals(t1.data("time"), map(float, range(0,10)))
+        assert_equals(wall.read_object("obj").data, {"last": 9})
+        assert_equals(len(wall._index["T1"]), 10)
+        assert_equals(len(wall._index["T2"]), 5)
+
+def testColumns():
+    write_wall()
+    with WallReader(os.path.join("test_output","sample.wll")) as wall:
+        table = wall.read_table("T1")
+        cols = table.columns()
+        assert_equals(sorted(cols.keys()), sorted(table.variables()))
+        for name in table.variables():
+            assert_equals(cols[name], table.data(name))
+
+        cols = table.columns(["time", "a"], as_array=True)
+        assert_equals(sorted(cols.keys()), ["a", "time"])
+        assert_equals(list(cols["time"]), [0.0, 1.0, 2.0])
+        assert_equals(list(cols["a"]), [1.0, 2.0, 1.0])
+
+def testDecodeOnce():
+    wfile = os.path.join("test_output","sample_decode.wll")
+    with WallWriter(wfile) as wall:
+        t = wall.add_table(name="T1")
+        for i in range(20):
+            t.add_signal("s%d" % (i,))
+        wall.finalize()
+        for r in range(50):
+            t.add_row(*range(r, r+20))
+        wall.flush()
+
+    with WallReader(wfile) as wall:
+        # Every entry is decoded (once) by load_obj
+        calls = []
+        load = wall.ser.load_obj
+        wall.ser.load_obj = lambda *args, **kwargs: \
+            calls.append(1) or load(*args, **kwargs)
+        t = wall.read_table("T1")
+        for i in range(20):
+            assert_equals(t.data("s%d" % (i,)), range(i, i+50))
+        assert_equals(len(calls), 50)
+        # Returned lists are copies
+        t.data("s0").append(1)
+        assert_equals(t.columns(["s0"])["s0"], range(50))
+        assert_equals(len(calls), 50)
+
+        # Once discarded, the entries are decoded again
+        wall.clear_cache()
+        assert_equals(t.data("s1"), range(1, 51))
+        assert_equals(len(calls), 100)
+
+        # Tables bigger than the cache are never kept
+        wall.set_cache_size(20*50-1)
+        assert_equals(t.data("s2"), range(2, 52))
+        assert_equals(t.data("s3"), range(3, 53))
+        assert_equals(len(calls), 200)
+
+    with WallReader(wfile, cache_size=20*50) as wall:
+        calls = []
+        load = wall.ser.load_obj
+        wall.ser.load_obj = lambda *args, **kwargs: \
+            calls.append(1) or load(*args, **kwargs)
+        t = wall.read_table("T1")
+        assert_equals(t.data("s0"), range(50))
+        assert_equals(t.data("s1"), range(1, 51))
+        assert_equals(len(calls), 50)
+
+@raises(NameError)
+def testColumnsMissing():
+    write_wall()
+    with WallReader(os.path.join("test_output","sample.wll")) as wall:
+        wall.read_table("T1").columns(["time", "z"])
+
+def testWideTable():
+    n = 2000
+    names = map(lambda i: "s%d" % (i,), range(n))
+    wfile = os.path.join("test_output","sample_wide.wll")
+    with WallWriter(wfile) as wall:
+        t = wall.add_table(name="T1")
+        for name in names:
+            t.add_signal(name, vtype=int if name=="s7" else None)
+        t.add_alias("a", of="s1999", transform="inv")
+        wall.finalize()
+        for r in range(3):
+            t.add_row(*map(lambda i: i+r, range(n)))
+        t.add_row(**dict(map(lambda i: (names[i], -i), range(n))))
+        assert_raises(TypeError, t.add_row, *([1.0]*n))
+        wall.flush()
+
+    with WallReader(wfile) as wall:
+        t = wall.read_table("T1")
+        assert_equals(t.data("s0"), [0, 1, 2, 0])
+        assert_equals(t.data("s7"), [7, 8, 9, -7])
+        assert_equals(t.data("a"), [-1999, -2000, -2001, 1999])
+
+@raises(KeyError)
+def testMissingKeyword():
+    with WallWriter(os.path.join("test_output","sample_17.wll")) as wall:
+        t = wall.add_table(name="T1")
+        t.add_signal("time")
+        t.add_signal("x")
+        wall.finalize()
+        t.add_row(time=1.0)
+
+def testBlockRows():
+    import numpy
+
+    wfile = os.path.join("test_output","sample_blocks.wll")
+    assert_raises(ValueError, WallWriter, wfile, batch=True)
+    for (batch, blocks) in [(False, False), (False, True), (True, True)]:
+        with WallWriter(wfile, batch=batch, blocks=blocks) as wall:
+            t1 = wall.add_table(name="T1")
+            t1.add_signal("time", vtype=float)
+            t1.add_signal("x")
+            t1.add_alias("nx", of="x", transform="inv")
+            t2 = wall.add_table(name="T2")
+            t2.add_signal("y")
+            obj = wall.add_object("obj")
+            wall.finalize()
+            t1.add_row(0.0, 0)
+            t1.add_row(1.0, 1)
+            t1.add_rows([[2.0, 2], [3.0, 3]])
+            t2.add_row("a")
+            obj.add_fields(x=1)
+            t1.add_row(4.0, 4)
+            t1.add_rows([])
+            t2.add_rows(numpy.array([["b"], ["c"]]))
+            t2.add_row("d")
+            t1.add_rows(numpy.array([[5.0, 5.0], [6.0, 6.0]]))
+            assert_raises(ValueError, t1.add_rows, [[1.0, 2], [3.0]])
+            assert_raises(TypeError, t1.add_rows, [[1, 2]])
+            wall.flush()
+
+        with WallReader(wfile) as wall:
+            t1 = wall.read_table("T1")
+            t2 = wall.read_table("T2")
+            assert_equals(t1.data("time"), map(float, range(7)))
+            assert_equals(t1.data("x"), range(7))
+            assert_equals(t1.data("nx"), map(lambda x: -x, range(7)))
+            assert_equals(t2.data("y"), ["a", "b", "c", "d"])
+            assert_equals(t1.columns(["time", "nx"]),
+                          {"time": map(float, range(7)),
+                           "nx": map(lambda x: -x, range(7))})
+            assert_equals(t2.columns(), {"y": ["a", "b", "c", "d"]})
+            assert_equals(wall.read_object("obj").data, {"x": 1})
+            if batch:
+                # Rows (and blocks) of T1 before the row of T2 are one block
+                assert_equals(len(wall._index["T1"]), 3)
+            elif blocks:
+                assert_equals(len(wall._index["T1"]), 5)
+            else:
+                assert_equals(len(wall._index["T1"]), 7)
+
+        # Only walls with blocks need the newer ID
+        with open(wfile, "rb") as fp:
+            assert_equals(fp.read(14),
+                          "recon:wall:v02" if blocks else "recon:wall:v01")
+
+def testAsyncIO():
+    def write(wfile, **kwargs):
+        with WallWriter(wfile, **kwargs) as wall:
+            t = wall.add_table(name="T1")
+            t.add_signal("time")
+            t.add_signal("x")
+            obj = wall.add_object("obj")
+            wall.finalize()
+            for i in range(100):
+                t.add_row(float(i), i)
+                if i%10==0:
+                    obj.add_fields(count=i)
+                    wall.flush(wait=(i==50))
+            t.add_rows([[100.0, 100], [101.0, 101]])
+            wall.flush()
+
+    sfile = os.path.join("test_output","sample_sync.wll")
+    afile = os.path.join("test_output","sample_async.wll")
+    write(sfile)
+    for batch in [False, True]:
+        write(afile, async_io=True, queue_size=2, batch=batch, blocks=True)
+        with WallReader(afile) as wall:
+            t = wall.read_table("T1")
+            assert_equals(t.data("time"), map(float, range(102)))
+            assert_equals(t.data("x"), range(102))
+            assert_equals(wall.read_object("obj").data, {"count": 90})
+    write(afile, async_io=True)
+    with open(sfile, "rb") as sfp:
+        with open(afile, "rb") as afp:
+            assert_equals(sfp.read(), afp.read())
+
+def testAsyncIOError():
+    wfile = os.path.join("test_output","sample_async.wll")
+    wall = WallWriter(wfile, async_io=True)
+    t = wall.add_table(name="T1")
+    t.add_signal("x")
+    wall.finalize()
+    t.add_row(object())
+    wall.flush()
+    # The error is raised by the thread and then in the caller
+    assert_raises(TypeError, wall.close)
+    assert_equals(wall.fp.closed, True)
+
+def testPoll():
+    # Write a complete wall and then replay it, a few bytes at a time,
+    # to a wall that is being followed
+    wfile = os.path.join("test_output","sample_poll.wll")
+    with WallWriter(wfile, blocks=True) as wall:
+        t = wall.add_table(name="T1")
+        t.add_signal("time")
+        t.add_signal("x")
+        t.add_alias("nx", of="x", transform="inv")
+        obj = wall.add_object("obj")
+        wall.finalize()
+        wall.flush()
+        start = wall.fp.tell()
+        t.add_row(0.0, 0)
+        t.add_row(1.0, 1)
+        wall.flush()
+        obj.add_fields(name="Mike")
+        wall.flush()
+        t.add_rows([[2.0, 2], [3.0, 3]])
+        wall.flush()
+    with open(wfile, "rb") as fp:
+        contents = fp.read()
+
+    live = os.path.join("test_output","sample_live.wll")
+    with open(live, "wb") as fp:
+        fp.write(contents[:start])
+    with WallReader(live) as wall:
+        assert_equals(wall.poll(), {})
+        assert_equals(wall.read_table("T1").data("x"), [])
+        results = []
+        with open(live, "ab") as fp:
+            for end in range(start+5, len(contents)+5, 5):
+                fp.write(contents[end-5:end])
+                fp.flush()
+                results.append(wall.poll())
+        results = filter(lambda x: len(x)>0, results)
+        assert_equals(results, [{"T1": [[0.0, 0]]}, {"T1": [[1.0, 1]]},
+                                {"obj": [{"name": "Mike"}]},
+                                {"T1": [[2.0, 2], [3.0, 3]]}])
+        assert_equals(wall.poll(), {})
+        t = wall.read_table("T1")
+        assert_equals(t.data("time"), [0.0, 1.0, 2.0, 3.0])
+        assert_equals(t.data("nx"), [0, -1, -2, -3])
+        assert_equals(wall.read_object("obj").data, {"name": "Mike"})
+
+    # Polling after the entries have been read only returns new entries
+    with WallReader(wfile) as wall:
+        assert_equals(wall.read_table("T1").data("x"), [0, 1, 2, 3])
+        assert_equals(wall.poll(), {})
+        assert_equals(list(wall.follow(interval=0.01, timeout=0.02)), [])
+    with WallReader(wfile) as wall:
+        assert_equals(list(wall.follow(interval=0.01, timeout=0.02)),
+                      [{"T1": [[0.0, 0], [1.0, 1], [2.0, 2], [3.0, 3]],
+                        "obj": [{"name": "Mike"}]}])
+
+def testIndex():
+    wfile = os.path.join("test_output","sample_index.wll")
+    def write(**kwargs):
+        with WallWriter(wfile, **kwargs) as wall:
+            t1 = wall.add_table(name="T1")
+            t1.add_signal("time")
+            t1.add_signal("x")
+            t1.add_alias("nx", of="x", transform="inv")
+            t2 = wall.add_table(name="T2")
+            t2.add_signal("y")
+            obj = wall.add_object("obj")
+            assert_raises(KeyError, wall.add_object, "#idx")
+            wall.finalize()
+            for i in range(0,10):
+                t1.add_row(float(i), i)
+                if i%2==0:
+                    t2.add_row(str(i))
+                    wall.flush()
+            t1.add_rows([[10.0, 10], [11.0, 11]])
+            obj.add_fields(name="Mike")
+            wall.flush()
+
+    def check(wall, indexed):
+        t1 = wall.read_table("T1")
+        assert_equals(t1.data("time"), map(float, range(0,12)))
+        assert_equals(t1.data("nx"), map(lambda x: -x, range(0,12)))
+        assert_equals(t1.nrows(), 12)
+        assert_equals(wall.read_table("T2").data("y"), ["0","2","4","6","8"])
+        assert_equals(wall.read_table("T2").nrows(), 5)
+        assert_equals(wall.read_object("obj").data, {"name": "Mike"})
+        assert_equals(wall._rows!=None, indexed)
+        assert_equals(set(map(lambda x: x[0], wall.entries())),
+                      set(["T1", "T2", "obj"]))
+        assert_equals(wall.poll(), {})
+
+    for kwargs in [{}, {"batch": True, "blocks": True}, {"async_io": True}]:
+        write(index=True, **kwargs)
+        with WallReader(wfile) as wall:
+            check(wall, True)
+        with open(wfile, "rb") as fp:
+            contents = fp.read()
+
+        # Without the pointer (or with a bad one), the entries are scanned
+        with open(wfile, "wb") as fp:
+            fp.write(contents[:-3])
+        with WallReader(wfile) as wall:
+            check(wall, False)
+        with open(wfile, "wb") as fp:
+            fp.write(contents[:-8]+"\x00"*7+"\x20")
+        with WallReader(wfile) as wall:
+            check(wall, False)
+
+    write()
+    with WallReader(wfile) as wall:
+        check(wall, False)
+
+def testTimeRange():
+    wfile = os.path.join("test_output","sample_range.wll")
+    times = map(lambda i: 0.5*(i/2), range(0,100)) # Repeated values
+    for kwargs in [{"stride": 7}, {"index": True, "stride": 7},
+                   {"index": True, "stride": 7, "batch": True,
+                    "blocks": True}]:
+        with WallWriter(wfile, **kwargs) as wall:
+            t = wall.add_table(name="T1", abscissa="time")
+            t.add_signal("time")
+            t.add_signal("x")
+            t.add_alias("nx", of="x", transform="inv")
+            t.add_alias("nt", of="time", transform="inv")
+            t2 = wall.add_table(name="T2")
+            t2.add_signal("y")
+            wall.finalize()
+            for i in range(0,100):
+                t.add_row(times[i], i)
+                if i%10==9:
+                    t2.add_row(i)
+                    wall.flush()
+            wall.flush()
+        with WallReader(wfile) as wall:
+            t = wall.read_table("T1")
+            assert_equals(t.abscissa(), "time")
+            for (t0, t1) in [(None, None), (3.0, 7.5), (-1.0, 2.0),
+                             (20.0, None), (None, 0.0), (30.0, 40.0),
+                             (24.5, 24.5), (4.2, 4.3)]:
+                rows = filter(lambda i: (t0==None or times[i]>=t0) and \
+                                  (t1==None or times[i]<=t1), range(0,100))
+                assert_equals(t.data("x", t0=t0, t1=t1), rows)
+                assert_equals(t.data("nx", t0=t0, t1=t1),
+                              map(lambda i: -i, rows))
+                assert_equals(t.data("x", t0=t0, t1=t1, abscissa="x"),
+                              filter(lambda i: (t0==None or i>=t0) and \
+                                         (t1==None or i<=t1), range(0,100)))
+            (first, last) = wall._entry_range("T1", 10.0, 12.0)
+            assert first>0
+            assert last!=None
+            assert_raises(NameError, wall.read_table("T2").data, "y", t0=1.0)
+
+    # Marks are written in the wall (not only in the index), so a
+    # reader only decodes them and the entries in the range
+    with WallWriter(wfile, stride=5) as wall:
+        t = wall.add_table(name="T1", abscissa="time")
+        t.add_signal("time")
+        t.add_signal("x")
+        wall.finalize()
+        for i in range(0,50):
+            t.add_row(float(i), i)
+            wall.flush()
+    with WallReader(wfile) as wall:
+        calls = []
+        load = wall.ser.load_obj
+        wall.ser.load_obj = lambda *args, **kwargs: \
+            calls.append(1) or load(*args, **kwargs)
+        t = wall.read_table("T1")
+        assert_equals(t.data("x", t0=21.0, t1=22.0), [21, 22])
+        assert_equals(len(wall._marks["T1"]), 10)
+        # The mark entries, the check for a trailing index and the
+        # entries from one mark to the next
+        assert_equals(len(calls), 10+1+5)
+        del calls[:]
+        assert_equals(t.data("x"), range(0,50))
+        assert_equals(len(calls), 50)
+
+    with WallWriter(wfile) as wall:
+        t = wall.add_table(name="T1", abscissa="t")
+        t.add_signal("time")
+        assert_raises(NameError, wall.finalize)